@@ -33,6 +33,18 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
 )
 
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings, tmp_path):
+    # Фоновые потоки миниатюр пишут в общую базу в памяти и мешают
+    # очистке базы между тестами: в тестах миниатюры создаются сразу.
+    settings.THUMBNAIL_WORKERS = 0
+    # Картинки mixer и миниатюры sorl не попадают в рабочее дерево.
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_at',
+                    'created',)
+    list_filter = ('status', 'name',)
+    # В аргументах бывают письма со ссылками сброса пароля.
+    exclude = ('payload',)
+    readonly_fields = ('name', 'locked_by', 'locked_at', 'last_error',)
+
+
+admin.site.register(Job, JobAdmin)
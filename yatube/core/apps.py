@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import check_connections, configure_sqlite
+        connection_created.connect(configure_sqlite)
+        request_started.connect(check_connections)
+        if getattr(settings, 'TEMPLATE_WARMUP', False):
+            from .template_cache import warm_up
+            warm_up()
@@ -0,0 +1,178 @@
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+THREADS = 8
+# Сколько кусков потокового ответа поток может обогнать медленного клиента.
+STREAM_BUFFER = 16
+
+
+def environ_from_scope(scope, body):
+    """WSGI environ для HTTP-запроса ASGI.
+
+    Пути в WSGI — это байты UTF-8, прочитанные как latin-1.
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+    """ASGI-приложение поверх синхронного обработчика Django.
+
+    Django 2.2 не умеет асинхронные view, поэтому запрос целиком
+    обрабатывается в ограниченном пуле ``ASGI_THREADS`` потоков, а чтение
+    тела и отправка ответа идут в цикле событий: медленный клиент
+    не занимает поток, пока передаёт или получает данные.
+    """
+
+    def __init__(self, wsgi_application, threads=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            threads or getattr(settings, 'ASGI_THREADS', THREADS),
+            thread_name_prefix='asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+        chunks = asyncio.Queue(STREAM_BUFFER)
+        cancelled = threading.Event()
+        worker = loop.run_in_executor(
+            self.executor, self._run, environ_from_scope(scope, body),
+            loop, started, chunks, cancelled)
+        try:
+            status, headers, content = await started
+            await send({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers],
+            })
+            if content is None:
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is None:
+                        break
+                    await send({'type': 'http.response.body',
+                                'body': chunk, 'more_body': True})
+                content = b''
+            await send({'type': 'http.response.body', 'body': content})
+            await worker
+        finally:
+            if not worker.done():
+                # Клиент ушёл: поток не должен ждать места в очереди.
+                cancelled.set()
+                while not chunks.empty():
+                    chunks.get_nowait()
+            body.close()
+
+    def _run(self, environ, loop, started, chunks, cancelled):
+        """Вызывает WSGI-приложение в потоке пула.
+
+        Обычный ответ целиком передаётся в цикл событий, и поток сразу
+        свободен. Потоковый ответ (экспорт) перебирается в этом же потоке:
+        его итератор держит курсор базы, привязанный к потоку.
+        """
+        start = []
+        streaming = False
+
+        def start_response(status, headers, exc_info=None):
+            start[:] = [status, headers]
+
+        def put(chunk):
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+        try:
+            response = self.wsgi_application(environ, start_response)
+            streaming = getattr(response, 'streaming', False)
+            try:
+                content = None if streaming else b''.join(response)
+                loop.call_soon_threadsafe(
+                    _resolve, started, (*start, content))
+                if streaming:
+                    for chunk in response:
+                        if cancelled.is_set():
+                            break
+                        if chunk:
+                            put(chunk)
+            finally:
+                response.close()
+        except Exception as error:
+            loop.call_soon_threadsafe(_resolve, started, None, error)
+            raise
+        finally:
+            if streaming:
+                put(None)
+
+
+def _resolve(future, result, error=None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
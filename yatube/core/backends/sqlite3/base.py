@@ -0,0 +1,16 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, в котором транзакция сразу берёт блокировку на запись.
+
+    Обычный BEGIN откладывает блокировку до первой записи. Если
+    транзакция успела прочитать базу (это делают и триггеры поискового
+    индекса FTS5), а запись уже начал другой процесс, SQLite не ждёт
+    busy timeout, а сразу отвечает «database is locked»: иначе
+    транзакции заблокировали бы друг друга. BEGIN IMMEDIATE ждёт свою
+    очередь в начале транзакции, пока она ничего не прочитала.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
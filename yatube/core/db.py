@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import connections, transaction
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Применяет ``SQLITE_PRAGMAS`` к каждому новому соединению SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_connections(**kwargs):
+    """Закрывает сохранённые соединения, которые перестали отвечать.
+
+    Django 2.2 проверяет постоянное соединение только после ошибки
+    в прошлом запросе; с ``CONN_HEALTH_CHECKS`` в настройках базы
+    проверка делается в начале каждого запроса, и новый запрос
+    не получит соединение, разорванное базой во время простоя.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+def on_commit(func):
+    """Выполняет ``func`` после коммита текущей транзакции, вне её — сразу.
+
+    Для обновлений кэша: до коммита другой запрос не видит новых строк
+    и закэшировал бы старые под новой версией, а после отката строк
+    в кэше вообще не должно быть. ``CACHE_ON_COMMIT = False`` (профиль
+    тестов) выполняет ``func`` сразу: ``TestCase`` в Django 2.2
+    откатывает транзакцию теста, не вызывая колбэков on_commit.
+    """
+    if getattr(settings, 'CACHE_ON_COMMIT', True):
+        transaction.on_commit(func)
+    else:
+        func()
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 с числом итераций из ``PBKDF2_ITERATIONS``.
+
+    Хэш с другим числом итераций пересчитывается при следующем входе
+    пользователя: Django сверяет параметры в ``must_update``.
+    """
+
+    @property
+    def iterations(self):
+        return _setting('PBKDF2_ITERATIONS',
+                        hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 с параметрами из настроек.
+
+    ``ARGON2_TIME_COST`` — число проходов, ``ARGON2_MEMORY_COST`` —
+    память в КиБ, ``ARGON2_PARALLELISM`` — число потоков. Нужен пакет
+    argon2-cffi; при смене параметров хэш пересчитывается при входе.
+    """
+
+    @property
+    def time_cost(self):
+        return _setting('ARGON2_TIME_COST',
+                        hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _setting('ARGON2_MEMORY_COST',
+                        hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _setting('ARGON2_PARALLELISM',
+                        hashers.Argon2PasswordHasher.parallelism)
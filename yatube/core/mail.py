@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .tasks import task
+
+SEND_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+
+def _send_connection():
+    return get_connection(getattr(settings, 'TASK_EMAIL_BACKEND',
+                                  SEND_BACKEND))
+
+
+@task
+def send_email(message):
+    email = EmailMultiAlternatives(
+        connection=_send_connection(),
+        alternatives=[tuple(item) for item in message.pop('alternatives')],
+        **message,
+    )
+    email.send()
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Отправляет письма из воркера очереди задач.
+
+    Запрос только ставит письмо в очередь, отправляет его
+    ``TASK_EMAIL_BACKEND``. Письма с вложениями уходят сразу:
+    вложения не сериализуются в аргументы задачи.
+    """
+
+    def send_messages(self, email_messages):
+        direct = []
+        for message in email_messages:
+            if message.attachments:
+                direct.append(message)
+                continue
+            send_email.delay({
+                'subject': message.subject,
+                'body': message.body,
+                'from_email': message.from_email,
+                'to': message.to,
+                'cc': message.cc,
+                'bcc': message.bcc,
+                'reply_to': message.reply_to,
+                'headers': message.extra_headers,
+                'alternatives': getattr(message, 'alternatives', []),
+            })
+        if direct:
+            _send_connection().send_messages(direct)
+        return len(email_messages)
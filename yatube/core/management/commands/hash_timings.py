@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+CANDIDATES = (
+    'core.hashers.Argon2PasswordHasher',
+    'core.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+)
+PARAMETERS = ('iterations', 'time_cost', 'memory_cost', 'parallelism',
+              'rounds')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время хэширования и проверки пароля '
+            'каждым алгоритмом на этой машине.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Замеров на алгоритм')
+        parser.add_argument(
+            '--hasher', action='append',
+            help='Путь к классу хэшера; по умолчанию PASSWORD_HASHERS '
+                 'и основные алгоритмы Django')
+
+    def handle(self, *args, **options):
+        paths = options['hasher'] or list(dict.fromkeys(
+            [*settings.PASSWORD_HASHERS, *CANDIDATES]))
+        seen = set()
+        for path in paths:
+            hasher = import_string(path)()
+            if hasher.algorithm in seen:
+                continue
+            seen.add(hasher.algorithm)
+            if hasher.library:
+                try:
+                    hasher._load_library()
+                except ValueError:
+                    self.stdout.write(f'{hasher.algorithm}: не установлена '
+                                      f'библиотека')
+                    continue
+            encode_ms, verify_ms = self._measure(hasher, options['repeat'])
+            parameters = ', '.join(
+                f'{name}={getattr(hasher, name)}' for name in PARAMETERS
+                if hasattr(hasher, name))
+            self.stdout.write(
+                f'{hasher.algorithm}: хэш {encode_ms:.2f} мс, '
+                f'проверка {verify_ms:.2f} мс'
+                + (f' ({parameters})' if parameters else ''))
+
+    def _measure(self, hasher, repeat):
+        password = get_random_string(16)
+        encode = verify = float('inf')
+        # Берётся лучший замер: остальные искажены шумом машины.
+        for _ in range(repeat):
+            started = time.perf_counter()
+            encoded = hasher.encode(password, hasher.salt())
+            encode = min(encode, time.perf_counter() - started)
+            started = time.perf_counter()
+            hasher.verify(password, encoded)
+            verify = min(verify, time.perf_counter() - started)
+        return encode * 1000, verify * 1000
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.tasks import BATCH_SIZE, work
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи фоновой очереди (core.tasks).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch', type=int, default=BATCH_SIZE,
+            help='Сколько задач захватывать за раз')
+        parser.add_argument(
+            '--idle', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунды')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выйти, когда готовых задач не останется')
+        parser.add_argument(
+            '--max-jobs', type=int, default=None,
+            help='Выйти после стольких задач')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            done, failed = work(
+                batch=options['batch'], idle=options['idle'],
+                until_empty=options['once'], max_jobs=options['max_jobs'])
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
+            return
+        elapsed = time.perf_counter() - started
+        rate = (done + failed) / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {done}, с ошибкой: {failed}, '
+            f'{rate:.1f} задач/с'))
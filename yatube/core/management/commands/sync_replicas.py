@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import replicas
+
+
+class Command(BaseCommand):
+    help = ('Копирует SQLite-базу primary в файлы реплик, '
+            'имитируя репликацию при локальной разработке.')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копирование поддерживается только для SQLite')
+        aliases = replicas()
+        if not aliases:
+            raise CommandError('Реплики не настроены: задайте YATUBE_REPLICAS')
+        primary.ensure_connection()
+        for alias in aliases:
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: скопировано')
+        self.stdout.write(self.style.SUCCESS(
+            f'Реплик обновлено: {len(aliases)}'))
@@ -0,0 +1,58 @@
+from django.db import models
+from django.utils import timezone
+
+MAX_ATTEMPTS = 5
+
+
+class Job(models.Model):
+    """Задача фоновой очереди (core.tasks)."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField(verbose_name='Задача', max_length=200)
+    payload = models.TextField(verbose_name='Аргументы (JSON)')
+    key = models.CharField(
+        verbose_name='Ключ',
+        max_length=200,
+        blank=True,
+        help_text='Пока задача с ключом ждёт, такая же не ставится',
+    )
+    status = models.CharField(
+        verbose_name='Состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveIntegerField(verbose_name='Попыток',
+                                           default=0)
+    max_attempts = models.PositiveIntegerField(
+        verbose_name='Попыток всего', default=MAX_ATTEMPTS)
+    run_at = models.DateTimeField(verbose_name='Выполнить после',
+                                  default=timezone.now)
+    created = models.DateTimeField(verbose_name='Поставлена',
+                                   auto_now_add=True)
+    locked_by = models.CharField(verbose_name='Захвачена', max_length=32,
+                                 blank=True)
+    locked_at = models.DateTimeField(verbose_name='Время захвата',
+                                     null=True, blank=True)
+    last_error = models.TextField(verbose_name='Последняя ошибка',
+                                  blank=True)
+
+    class Meta:
+        verbose_name = ('Задачи')
+        verbose_name_plural = ('Задачи')
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'id'],
+                         name='job_status_run_at_idx'),
+            models.Index(fields=['key', 'status'], name='job_key_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
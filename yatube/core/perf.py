@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('yatube.perf')
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_local = threading.local()
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rendering = False
+
+
+def current():
+    """Метрики запроса, который обрабатывается в этом потоке."""
+    return getattr(_local, 'metrics', None)
+
+
+def record_cache(hit):
+    metrics = current()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def _timed_execute(execute, sql, params, many, context):
+    metrics = current()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.sql += time.perf_counter() - started
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        metrics = current()
+        # Вложенный render_to_string уже входит во время внешнего шаблона.
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django, шаблоны которого замеряют рендеринг.
+
+    Подключается в ``TEMPLATES`` вместо стандартного; вне
+    ``PerformanceMiddleware`` замер ничего не делает.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def observe(name, total, metrics):
+    with _histograms_lock:
+        stats = _histograms.setdefault(name, {
+            'count': 0,
+            'total_ms': 0.0,
+            'sql_ms': 0.0,
+            'template_ms': 0.0,
+            'queries': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'buckets': [0] * (len(BUCKETS_MS) + 1),
+        })
+        stats['count'] += 1
+        stats['total_ms'] += total * 1000
+        stats['sql_ms'] += metrics.sql * 1000
+        stats['template_ms'] += metrics.template * 1000
+        stats['queries'] += metrics.queries
+        stats['cache_hits'] += metrics.cache_hits
+        stats['cache_misses'] += metrics.cache_misses
+        stats['buckets'][bisect_left(BUCKETS_MS, total * 1000)] += 1
+
+
+def snapshot():
+    """Гистограммы времени ответа по имени URL в текущем процессе."""
+    with _histograms_lock:
+        report = {}
+        for name, stats in _histograms.items():
+            count = stats['count']
+            labels = [str(bound) for bound in BUCKETS_MS] + ['+Inf']
+            report[name] = {
+                'count': count,
+                'avg_ms': stats['total_ms'] / count,
+                'avg_sql_ms': stats['sql_ms'] / count,
+                'avg_template_ms': stats['template_ms'] / count,
+                'avg_queries': stats['queries'] / count,
+                'cache_hits': stats['cache_hits'],
+                'cache_misses': stats['cache_misses'],
+                'buckets_ms': dict(zip(labels, stats['buckets'])),
+            }
+        return report
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class PerformanceMiddleware:
+    """Замеряет время запроса, SQL, шаблоны и кэш.
+
+    Итог уходит в заголовок ``Server-Timing``, строку лога ``yatube.perf``
+    и гистограммы по имени URL, которые отдаёт ``core:perf``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_timed_execute))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        name = match.view_name if match else '<unresolved>'
+        observe(name, total, metrics)
+        response['Server-Timing'] = ', '.join((
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={metrics.sql * 1000:.1f};desc="{metrics.queries} q"',
+            f'tpl;dur={metrics.template * 1000:.1f}',
+            f'cache;desc="{metrics.cache_hits} hit '
+            f'{metrics.cache_misses} miss"',
+        ))
+        logger.info(json.dumps({
+            'view': name,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql * 1000, 2),
+            'template_ms': round(metrics.template * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+        }))
+        return response
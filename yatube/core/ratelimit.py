@@ -0,0 +1,141 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+CACHE_PREFIX = 'ratelimit'
+METHODS = ('POST',)
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# Поля формы, по которым узнаётся пользователь анонимного запроса.
+USER_FIELDS = ('username', 'email')
+ACCOUNT_KEYS = tuple(f'{field}:' for field in USER_FIELDS)
+ACCOUNT_SUFFIX = ':account'
+ACCOUNT_FACTOR = 10
+
+
+def _cache():
+    return caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+
+def parse_rate(rate):
+    """``'10/m'`` или ``'10/5m'`` -> (запросов, период в секундах)."""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period[-1]] * int(period[:-1] or 1)
+
+
+def _digest(value):
+    # Значение из формы не попадает в ключ кэша как есть.
+    return hashlib.md5(str(value).encode()).hexdigest()
+
+
+def client_keys(request):
+    """Корзины запроса: адрес клиента и пользователь.
+
+    Для анонимного запроса пользователем считается логин или почта из
+    формы, так что перебор паролей к одному аккаунту с разных адресов
+    тоже упирается в лимит.
+    """
+    keys = [f"ip:{request.META.get('REMOTE_ADDR', '')}"]
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        keys.append(f'user:{user.pk}')
+        return keys
+    for field in USER_FIELDS:
+        value = request.POST.get(field, '').strip().lower()
+        if value:
+            keys.append(f'{field}:{_digest(value)}')
+            break
+    return keys
+
+
+def account_rate(limits, name, rate):
+    """Лимит корзины аккаунта из формы анонимного запроса.
+
+    Берётся из ``RATE_LIMITS['<имя URL>:account']``, по умолчанию
+    в ``ACCOUNT_FACTOR`` раз больше лимита адреса. Такую корзину может
+    тратить кто угодно, зная логин: чтобы заблокировать владельца,
+    придётся упереться в лимиты ``ACCOUNT_FACTOR`` адресов сразу.
+    """
+    if f'{name}{ACCOUNT_SUFFIX}' in limits:
+        return limits[f'{name}{ACCOUNT_SUFFIX}']
+    count, period = parse_rate(rate)
+    return f'{count * ACCOUNT_FACTOR}/{period}s'
+
+
+def consume(scope, buckets, now=None):
+    """Берёт по токену из корзин лимита ``scope``.
+
+    ``buckets`` сопоставляет ключу корзины её лимит вида ``'10/m'``.
+    Возвращает 0, если запрос разрешён, иначе через сколько секунд
+    появится токен. Корзина вмещает столько токенов, сколько запросов
+    разрешено за период, и пополняется равномерно. В кэше лежит одно
+    число на ключ — момент, когда корзина снова станет полной (GCRA),
+    поэтому пополнять её в фоне не нужно. Токен списывается, только
+    если он есть во всех корзинах.
+    """
+    now = time.time() if now is None else now
+    cache = _cache()
+    rates = {f'{CACHE_PREFIX}:{scope}:{key}': parse_rate(rate)
+             for key, rate in buckets.items()}
+    found = cache.get_many(list(rates))
+    full_at = {name: max(found.get(name, now), now) + period / count
+               for name, (count, period) in rates.items()}
+    wait = max(full_at[name] - now - period
+               for name, (_, period) in rates.items())
+    if wait > 0:
+        return wait
+    # Через период корзина в любом случае полна: ключ больше не нужен.
+    cache.set_many(full_at, math.ceil(
+        max(period for _, period in rates.values())))
+    return 0
+
+
+def too_many_requests(wait):
+    response = HttpResponse('Слишком много запросов, попробуйте позже.',
+                            status=429,
+                            content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = max(math.ceil(wait), 1)
+    return response
+
+
+class RateLimitMiddleware:
+    """Ограничивает частоту запросов к view из ``RATE_LIMITS``.
+
+    ``RATE_LIMITS`` сопоставляет имени URL лимит вида ``'10/m'``.
+    Лимитируются только методы из ``RATE_LIMIT_METHODS`` (по умолчанию
+    POST), отдельно для адреса клиента и для пользователя; у аккаунта
+    из формы входа свой, больший лимит (``account_rate``). Сверх лимита
+    view не вызывается, а клиент получает 429 с Retry-After. Корзины
+    хранятся в кэше ``RATE_LIMIT_CACHE``: общем для всех процессов, если
+    это общий бэкенд, или в памяти процесса с LocMemCache. Проверка
+    и запись не атомарны, поэтому параллельные запросы могут немного
+    превысить лимит.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        limits = getattr(settings, 'RATE_LIMITS', {})
+        if not limits or request.method not in getattr(
+                settings, 'RATE_LIMIT_METHODS', METHODS):
+            return None
+        name = request.resolver_match.view_name
+        rate = limits.get(name)
+        if rate is None:
+            return None
+        buckets = {}
+        for key in client_keys(request):
+            buckets[key] = rate
+            if key.startswith(ACCOUNT_KEYS):
+                buckets[key] = account_rate(limits, name, rate)
+        wait = consume(name, buckets)
+        if wait:
+            return too_many_requests(wait)
+        return None
@@ -0,0 +1,116 @@
+import itertools
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary'
+PIN_SECONDS = 5
+REPLICA_MODELS = ('auth.user', 'posts.group', 'posts.post', 'posts.profile')
+REPLICA_VIEW_MODULES = ('posts.api', 'posts.views')
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+_turns = itertools.count()
+_turns_lock = threading.Lock()
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def reads_from_replicas():
+    """Можно ли текущему запросу читать с реплик."""
+    return getattr(_local, 'replica_reads', False)
+
+
+@contextmanager
+def primary_reads():
+    """Направляет чтения внутри блока в primary.
+
+    Нужен тем, кто кладёт прочитанное в общий кэш под текущим
+    поколением: отстающая реплика закэшировала бы старые данные
+    уже после ``bump_feeds``.
+    """
+    previous = reads_from_replicas()
+    _local.replica_reads = False
+    try:
+        yield
+    finally:
+        _local.replica_reads = previous
+
+
+def next_replica():
+    aliases = replicas()
+    with _turns_lock:
+        turn = next(_turns)
+    return aliases[turn % len(aliases)]
+
+
+class ReplicaRouter:
+    """Отправляет чтения постов, групп и пользователей на реплики.
+
+    Реплики используются только внутри GET-запросов к view из
+    ``REPLICA_VIEW_MODULES``, которые разрешил ``ReplicaMiddleware``;
+    все записи и остальные чтения идут в ``default``.
+    """
+
+    def _replicated(self, model):
+        return model._meta.label_lower in getattr(
+            settings, 'REPLICA_MODELS', REPLICA_MODELS)
+
+    def db_for_read(self, model, **hints):
+        if replicas() and reads_from_replicas() and self._replicated(model):
+            return next_replica()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный с реплики, всё равно сохраняется в primary.
+        if self._replicated(model):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема и данные приходят на реплики репликацией.
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик для безопасных запросов к лентам.
+
+    После запроса, меняющего данные, клиент получает на
+    ``REPLICA_PIN_SECONDS`` секунд cookie, с которой его чтения идут
+    в primary: свои изменения он видит сразу, не дожидаясь реплик.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.replica_reads = False
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', httponly=True, samesite='Lax',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', PIN_SECONDS))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        modules = getattr(settings, 'REPLICA_VIEW_MODULES',
+                          REPLICA_VIEW_MODULES)
+        _local.replica_reads = (
+            request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+            and view_func.__module__ in modules
+        )
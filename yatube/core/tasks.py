@@ -0,0 +1,168 @@
+import datetime
+import json
+import logging
+import time
+import traceback
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import MAX_ATTEMPTS, Job
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+LEASE = 60 * 5
+ERROR_LENGTH = 4000
+
+
+def eager():
+    """Выполнять ли задачи сразу при постановке, без воркера."""
+    return getattr(settings, 'TASKS_EAGER', True)
+
+
+def task(function):
+    """Делает функцию фоновой задачей.
+
+    ``function.delay(*args, **kwargs)`` ставит её в очередь; аргументы
+    должны сериализоваться в JSON. Воркер находит функцию по имени
+    модуля, поэтому задачи объявляются на уровне модуля.
+    """
+    function.task_name = f'{function.__module__}.{function.__qualname__}'
+    function.delay = (
+        lambda *args, **kwargs: enqueue(function, args, kwargs))
+    return function
+
+
+def enqueue(function, args=(), kwargs=None, key=''):
+    """Ставит задачу в очередь и возвращает ``Job``.
+
+    С ``TASKS_EAGER`` задача выполняется сразу и возвращается ``None``.
+    Пока в очереди есть задача с тем же непустым ``key``, новая не
+    ставится. Внутри транзакции задача появится только вместе
+    с остальными её изменениями.
+    """
+    kwargs = kwargs or {}
+    if eager():
+        function(*args, **kwargs)
+        return None
+    if key and Job.objects.filter(
+            key=key, status__in=(Job.QUEUED, Job.RUNNING)).exists():
+        return None
+    return Job.objects.create(
+        name=function.task_name,
+        payload=json.dumps([list(args), kwargs], cls=DjangoJSONEncoder),
+        key=key,
+        max_attempts=getattr(settings, 'TASK_MAX_ATTEMPTS', MAX_ATTEMPTS),
+    )
+
+
+def retry_delay(attempts):
+    """Пауза перед повтором: удваивается с каждой неудачной попыткой."""
+    delay = getattr(settings, 'TASK_RETRY_DELAY', RETRY_DELAY)
+    return min(delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def _due(now):
+    # Задачу, захваченную упавшим воркером, забирают после аренды.
+    lease = getattr(settings, 'TASK_LEASE', LEASE)
+    return (Q(status=Job.QUEUED, run_at__lte=now)
+            | Q(status=Job.RUNNING,
+                locked_at__lt=now - datetime.timedelta(seconds=lease)))
+
+
+def claim(limit=BATCH_SIZE):
+    """Захватывает до ``limit`` готовых задач одним UPDATE.
+
+    Захват одной командой не даёт двум воркерам взять одну задачу
+    и не требует повышать блокировку SQLite внутри транзакции.
+    """
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = Job.objects.filter(_due(now)).order_by('run_at', 'pk')
+    Job.objects.filter(_due(now), pk__in=due.values('pk')[:limit]).update(
+        status=Job.RUNNING, locked_by=token, locked_at=now,
+        attempts=F('attempts') + 1)
+    return list(Job.objects.filter(locked_by=token, status=Job.RUNNING)
+                .order_by('run_at', 'pk'))
+
+
+def _resolve(name):
+    function = import_string(name)
+    if getattr(function, 'task_name', None) != name:
+        raise ImportError(f'{name} не объявлена как задача')
+    return function
+
+
+def run(job):
+    """Выполняет захваченную задачу; ``True``, если она удалась.
+
+    Удачная задача удаляется из очереди, неудачная ждёт повтора
+    или, исчерпав попытки, остаётся в состоянии ``failed``.
+    """
+    try:
+        args, kwargs = json.loads(job.payload)
+        function = _resolve(job.name)
+        with transaction.atomic():
+            function(*args, **kwargs)
+    except Exception:
+        logger.exception('Задача %s не выполнена', job)
+        _fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).delete()
+    return True
+
+
+def _fail(job, error):
+    # Аргументы провалившейся задачи больше не нужны, а в них бывают
+    # письма со ссылками сброса пароля.
+    changes = {'status': Job.FAILED, 'payload': ''}
+    if job.attempts < job.max_attempts:
+        changes = {
+            'status': Job.QUEUED,
+            'run_at': timezone.now() + datetime.timedelta(
+                seconds=retry_delay(job.attempts)),
+        }
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, last_error=error[-ERROR_LENGTH:],
+        **changes)
+
+
+def work(batch=BATCH_SIZE, idle=1.0, until_empty=False, max_jobs=None):
+    """Цикл воркера; возвращает число удачных и неудачных задач.
+
+    ``until_empty`` завершает цикл, когда готовых задач не осталось,
+    иначе воркер ждёт новые, опрашивая очередь раз в ``idle`` секунд.
+    """
+    done = failed = 0
+    while max_jobs is None or done + failed < max_jobs:
+        close_old_connections()
+        limit = batch
+        if max_jobs is not None:
+            limit = min(batch, max_jobs - done - failed)
+        try:
+            jobs = claim(limit)
+        except OperationalError:
+            # Например, база занята другим процессом: воркер не падает,
+            # а повторяет захват после паузы.
+            logger.exception('Не удалось захватить задачи')
+            time.sleep(idle)
+            continue
+        if not jobs:
+            if until_empty:
+                break
+            time.sleep(idle)
+            continue
+        for job in jobs:
+            if run(job):
+                done += 1
+            else:
+                failed += 1
+    return done, failed
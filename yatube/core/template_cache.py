@@ -0,0 +1,61 @@
+import os
+
+from django.conf import settings
+from django.template import engines
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+WARMUP_PREFIXES = ('posts/', 'users/', 'about/', 'includes/')
+
+
+def _loaders(engine):
+    for loader in engine.template_loaders:
+        yield from getattr(loader, 'loaders', [loader])
+
+
+def template_names(engine, prefixes):
+    """Имена шаблонов на диске, начинающиеся с ``prefixes``."""
+    names = set()
+    for loader in _loaders(engine):
+        for directory in loader.get_dirs():
+            for root, _, files in os.walk(directory):
+                for file_name in files:
+                    name = os.path.relpath(
+                        os.path.join(root, file_name), directory)
+                    name = name.replace(os.sep, '/')
+                    if name.startswith(prefixes):
+                        names.add(name)
+    return names
+
+
+def _references(template):
+    # Имена из {% extends %} и {% include %}, заданные строкой.
+    nodes = template.nodelist.get_nodes_by_type(ExtendsNode)
+    expressions = [node.parent_name for node in nodes]
+    expressions += [node.template for node in
+                    template.nodelist.get_nodes_by_type(IncludeNode)]
+    return {expression.var for expression in expressions
+            if isinstance(expression.var, str) and not expression.filters}
+
+
+def referenced_templates(engine=None, prefixes=None):
+    """Шаблоны приложений вместе со всем, что они наследуют и включают."""
+    engine = engine or engines['django'].engine
+    if prefixes is None:
+        prefixes = tuple(getattr(settings, 'TEMPLATE_WARMUP_PREFIXES',
+                                 WARMUP_PREFIXES))
+    pending = template_names(engine, prefixes)
+    found = {}
+    while pending:
+        name = pending.pop()
+        found[name] = engine.get_template(name)
+        pending |= _references(found[name]) - set(found)
+    return found
+
+
+def warm_up():
+    """Разбирает шаблоны заранее, чтобы первые запросы их не ждали.
+
+    Имеет смысл с cached loader: разобранные шаблоны остаются
+    в его кэше на всё время жизни процесса.
+    """
+    return sorted(referenced_templates())
@@ -0,0 +1,49 @@
+from django import template
+
+register = template.Library()
+
+ON_EACH_SIDE = 2
+ON_ENDS = 1
+
+
+def elided_page_range(number, num_pages, on_each_side=ON_EACH_SIDE,
+                      on_ends=ON_ENDS, exact=True):
+    """Номера страниц для навигации; ``None`` — пропуск.
+
+    Показываются ``on_ends`` первых и последних страниц и
+    ``on_each_side`` страниц по обе стороны от текущей. Если число
+    страниц неточное (``exact=False``), последних страниц не видно.
+    """
+    pages = set(range(1, min(on_ends, num_pages) + 1))
+    pages |= set(range(max(number - on_each_side, 1),
+                       min(number + on_each_side, num_pages) + 1))
+    pages.add(number)
+    if exact:
+        pages |= set(range(max(num_pages - on_ends + 1, 1), num_pages + 1))
+    result = []
+    previous = 0
+    for page in sorted(pages):
+        if page - previous == 2 and page - 1 <= num_pages:
+            # Вместо пропуска одной страницы показываем её саму.
+            result.append(page - 1)
+        elif page - previous >= 2:
+            result.append(None)
+        result.append(page)
+        previous = page
+    return result
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=ON_EACH_SIDE, on_ends=ON_ENDS):
+    """Окно номеров вокруг ``page_obj`` вместо всего ``page_range``.
+
+    Для пагинатора с ограниченным подсчётом (``count_is_exact`` ложно)
+    за окном ставится пропуск, если дальше есть страницы.
+    """
+    paginator = page_obj.paginator
+    exact = getattr(paginator, 'count_is_exact', True)
+    pages = elided_page_range(page_obj.number, paginator.num_pages,
+                              on_each_side, on_ends, exact)
+    if not exact and page_obj.has_next():
+        pages.append(None)
+    return pages
@@ -0,0 +1,570 @@
+import asyncio
+import datetime
+import io
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.template.backends.django import Template as DjangoTemplate
+from django.template.loader import render_to_string
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from about.views import AboutAuthorView
+from posts import views as posts_views
+from posts.models import Group, Post
+from posts.pagecache import cache_feed
+from posts.paginators import KeysetPage, KeysetPaginator
+from posts.search import install
+
+from . import perf, tasks
+from .asgi import ASGIHandler, environ_from_scope
+from .db import check_connections
+from .ratelimit import account_rate, consume, parse_rate
+from .models import Job
+from .routers import (PIN_COOKIE, ReplicaMiddleware, ReplicaRouter,
+                      primary_reads)
+from .template_cache import warm_up
+from .templatetags.pagination import elided_page_range, page_window
+
+User = get_user_model()
+DONE = []
+
+
+@tasks.task
+def remember(value):
+    DONE.append(value)
+
+
+@tasks.task
+def explode():
+    raise RuntimeError('сбой задачи')
+
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        perf.reset()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('about:author'))
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'tpl;dur=', 'cache;desc='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
+    def test_histograms_by_url_name(self):
+        self.client.get(reverse('about:author'))
+        self.client.get(reverse('about:author'))
+        response = self.staff_client.get(reverse('core:perf'))
+        stats = response.json()['about:author']
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(sum(stats['buckets_ms'].values()), 2)
+        self.assertGreater(stats['avg_template_ms'], 0)
+
+    def test_django_templates_are_not_patched(self):
+        self.assertEqual(DjangoTemplate.render.__module__,
+                         'django.template.backends.django')
+        template = engines['django'].get_template('about/author.html')
+        self.assertIsInstance(template, perf.TimedTemplate)
+
+    def test_stats_are_staff_only(self):
+        user = User.objects.create_user('user')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:perf'))
+        self.assertNotEqual(response.status_code, 200)
+
+
+def call_asgi(application, path, body=b'', headers=()):
+    messages = []
+    chunks = [{'type': 'http.request', 'body': body[:3], 'more_body': True},
+              {'type': 'http.request', 'body': body[3:]}]
+
+    async def receive():
+        return chunks.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': 'POST' if body else 'GET',
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'host', b'testserver'), *headers],
+    }
+    asyncio.run(application(scope, receive, send))
+    return messages
+
+
+class ASGIHandlerTest(SimpleTestCase):
+    def test_environ_from_scope(self):
+        environ = environ_from_scope({
+            'method': 'GET',
+            'path': '/profile/юзер/',
+            'query_string': b'page=2',
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'accept', b'text/html'),
+                        (b'accept', b'*/*')],
+        }, io.BytesIO())
+        self.assertEqual(
+            environ['PATH_INFO'].encode('latin-1').decode(), '/profile/юзер/')
+        self.assertEqual(environ['QUERY_STRING'], 'page=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,*/*')
+
+    def test_serves_django_views(self):
+        application = ASGIHandler(WSGIHandler(), threads=2)
+        messages = call_asgi(application, reverse('about:author'))
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(b'Server-Timing', dict(messages[0]['headers']))
+        self.assertTrue(messages[1]['body'])
+        application.executor.shutdown()
+
+    def test_request_body_and_streaming_response(self):
+        def wsgi_application(environ, start_response):
+            data = environ['wsgi.input'].read()
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return StreamingHttpResponse(iter([data, b'-', data]))
+
+        application = ASGIHandler(wsgi_application, threads=1)
+        messages = call_asgi(application, '/', body=b'payload')
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(
+            b''.join(message.get('body', b'') for message in messages[1:]),
+            b'payload-payload')
+        self.assertFalse(messages[-1].get('more_body'))
+        application.executor.shutdown()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def read_aliases(self, request, view):
+        aliases = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            aliases.extend(Post.objects.all().db for _ in range(3))
+            aliases.append(Group.objects.all().db)
+            aliases.append(User.objects.all().db)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        return aliases, middleware(request)
+
+    def test_feed_reads_rotate_replicas(self):
+        aliases, _ = self.read_aliases(
+            RequestFactory().get('/'), posts_views.index)
+        self.assertEqual(set(aliases), {'replica1', 'replica2'})
+        self.assertNotEqual(aliases[0], aliases[1])
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_other_views_read_primary(self):
+        aliases, _ = self.read_aliases(
+            RequestFactory().get('/about/author/'),
+            AboutAuthorView.as_view())
+        self.assertEqual(set(aliases), {'default'})
+
+    def test_write_pins_client_to_primary(self):
+        aliases, response = self.read_aliases(
+            RequestFactory().post('/create/'), posts_views.post_create)
+        self.assertEqual(set(aliases), {'default'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        aliases, _ = self.read_aliases(request, posts_views.index)
+        self.assertEqual(set(aliases), {'default'})
+
+    @override_settings(REPLICA_VIEW_MODULES=[__name__])
+    def test_cache_fill_reads_primary(self):
+        cache.clear()
+        aliases = []
+
+        @cache_feed('replica-test')
+        def view(request):
+            aliases.append(Post.objects.all().db)
+            with primary_reads():
+                aliases.append(Post.objects.all().db)
+            aliases.append(Post.objects.all().db)
+            return HttpResponse()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        middleware(request)
+        self.assertEqual(aliases, ['default'] * 3)
+        aliases.clear()
+        request = RequestFactory().get('/')
+        request.user = mock.Mock(is_authenticated=True)
+        middleware(request)
+        self.assertEqual(aliases[1], 'default')
+        self.assertIn(aliases[0], ('replica1', 'replica2'))
+        self.assertIn(aliases[2], ('replica1', 'replica2'))
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        router = ReplicaRouter()
+        post = Post(pk=1)
+        post._state.db = 'replica1'
+        self.assertEqual(router.db_for_write(Post, instance=post), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+
+class ConnectionTuningTest(SimpleTestCase):
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'WAL',
+                                       'synchronous': 'NORMAL',
+                                       'busy_timeout': 1234})
+    def test_pragmas_applied_to_new_connections(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('PRAGMA есть только у SQLite')
+        with tempfile.TemporaryDirectory() as workdir:
+            wrapper = connections['default'].__class__({
+                **connection.settings_dict,
+                'NAME': os.path.join(workdir, 'tuning.sqlite3'),
+            })
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous',
+                                 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1,
+                                   'busy_timeout': 1234})
+
+    def test_concurrent_writes_with_search_triggers(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Блокировки файла есть только у SQLite')
+        errors = []
+        with tempfile.TemporaryDirectory() as workdir:
+            settings_dict = {**connection.settings_dict,
+                             'NAME': os.path.join(workdir, 'writes.sqlite3')}
+            wrapper = connections['default'].__class__(settings_dict)
+            with wrapper.cursor() as cursor:
+                cursor.execute('CREATE TABLE posts_post '
+                               '(id integer PRIMARY KEY, text text)')
+            install(wrapper)
+            wrapper.close()
+
+            def write():
+                # Как post_create: вставка поста и счётчики в транзакции.
+                wrapper = connections['default'].__class__(settings_dict)
+                for _ in range(20):
+                    wrapper.set_autocommit(
+                        False,
+                        force_begin_transaction_with_broken_autocommit=True)
+                    try:
+                        with wrapper.cursor() as cursor:
+                            cursor.execute('INSERT INTO posts_post (text) '
+                                           "VALUES ('пост')")
+                            cursor.execute('SELECT count(*) FROM posts_post')
+                            cursor.execute("UPDATE posts_post SET text = 'x' "
+                                           'WHERE id = 1')
+                        wrapper.commit()
+                    except OperationalError as error:
+                        errors.append(error)
+                        wrapper.rollback()
+                    finally:
+                        wrapper.set_autocommit(True)
+                wrapper.close()
+
+            threads = [threading.Thread(target=write) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+    def test_health_check_closes_broken_connections(self):
+        broken = mock.Mock(settings_dict={'CONN_HEALTH_CHECKS': True})
+        broken.is_usable.return_value = False
+        unchecked = mock.Mock(settings_dict={})
+        with mock.patch('core.db.connections') as connections:
+            connections.all.return_value = [broken, unchecked]
+            check_connections()
+        broken.close.assert_called_once_with()
+        unchecked.is_usable.assert_not_called()
+
+    def test_production_profile(self):
+        from yatube import settings_production
+        self.assertFalse(settings_production.DEBUG)
+        database = settings_production.DATABASES['default']
+        self.assertGreater(database['CONN_MAX_AGE'], 0)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertEqual(
+            settings_production.SQLITE_PRAGMAS['journal_mode'], 'WAL')
+        self.assertFalse(settings_production.SERVE_MEDIA)
+
+
+class TemplateWarmUpTest(SimpleTestCase):
+    def test_warm_up_fills_cached_loader(self):
+        from yatube import settings_production
+        with override_settings(TEMPLATES=settings_production.TEMPLATES):
+            names = warm_up()
+            loader = engines['django'].engine.template_loaders[0]
+            self.assertEqual(set(loader.get_template_cache), set(names))
+        for name in ('base.html', 'includes/header.html',
+                     'includes/paginator.html', 'posts/index.html',
+                     'users/login.html', 'about/author.html'):
+            with self.subTest(name=name):
+                self.assertIn(name, names)
+        self.assertNotIn('admin/base.html', names)
+
+
+class PageWindowTest(SimpleTestCase):
+    def test_elided_page_range(self):
+        self.assertEqual(elided_page_range(1, 1), [1])
+        self.assertEqual(elided_page_range(5, 10),
+                         [1, 2, 3, 4, 5, 6, 7, None, 10])
+        self.assertEqual(elided_page_range(50000, 100000),
+                         [1, None, 49998, 49999, 50000, 50001, 50002,
+                          None, 100000])
+        # Последняя страница неизвестна: окно не выходит за подсчитанное.
+        self.assertEqual(elided_page_range(150, 100, exact=False),
+                         [1, None, 150])
+
+    def test_large_page_count_renders_window(self):
+        paginator = Paginator(range(10 ** 6), 10)
+        page = paginator.page(50000)
+        started = time.perf_counter()
+        content = render_to_string('includes/paginator.html',
+                                   {'page_obj': page})
+        elapsed = time.perf_counter() - started
+        self.assertEqual(content.count('<li'), 12)
+        self.assertIn('?page=100000', content)
+        self.assertLess(len(content), 4000)
+        self.assertLess(elapsed, 0.05)
+
+    def test_bounded_count_window(self):
+        posts = mock.MagicMock()
+        posts.order_by.return_value = posts
+        paginator = KeysetPaginator(posts, 10, bounded_count=1001)
+        page = KeysetPage(list(range(10)), 5, paginator)
+        self.assertEqual(page_window(page), [1, 2, 3, 4, 5, 6, 7, None])
+
+
+@override_settings(TASKS_EAGER=False, TASK_RETRY_DELAY=10,
+                   TASK_MAX_ATTEMPTS=2)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        DONE.clear()
+
+    def test_eager_mode_runs_inline(self):
+        with override_settings(TASKS_EAGER=True):
+            self.assertIsNone(remember.delay(1))
+        self.assertEqual(DONE, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_worker_runs_and_removes_jobs(self):
+        remember.delay(1)
+        remember.delay({'pk': 2})
+        self.assertEqual(DONE, [])
+        self.assertEqual(tasks.work(until_empty=True), (2, 0))
+        self.assertEqual(DONE, [1, {'pk': 2}])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_with_backoff(self):
+        explode.delay()
+        started = timezone.now()
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.work(until_empty=True), (0, 1))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('сбой задачи', job.last_error)
+        self.assertGreaterEqual(
+            job.run_at, started + datetime.timedelta(seconds=10))
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.work(until_empty=True), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(job.payload, '')
+        self.assertEqual(tasks.retry_delay(3), 40)
+
+    def test_worker_survives_locked_database(self):
+        remember.delay(1)
+        claim = tasks.claim
+        with mock.patch('core.tasks.claim', side_effect=[
+                OperationalError('database is locked'), claim()]), \
+                self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.work(idle=0, max_jobs=1), (1, 0))
+        self.assertEqual(DONE, [1])
+
+    def test_admin_hides_payload(self):
+        remember.delay(1)
+        job_admin = admin.site._registry[Job]
+        request = RequestFactory().get('/')
+        self.assertNotIn('payload',
+                         job_admin.get_fields(request, Job.objects.get()))
+        self.assertIn('name', job_admin.get_readonly_fields(request))
+
+    def test_key_deduplicates_waiting_jobs(self):
+        self.assertIsNotNone(tasks.enqueue(remember, (1,), key='one'))
+        self.assertIsNone(tasks.enqueue(remember, (1,), key='one'))
+        tasks.work(until_empty=True)
+        self.assertIsNotNone(tasks.enqueue(remember, (1,), key='one'))
+
+    def test_expired_lease_is_reclaimed(self):
+        remember.delay(1)
+        self.assertEqual(len(tasks.claim()), 1)
+        self.assertEqual(tasks.claim(), [])
+        Job.objects.update(locked_at=timezone.now() - datetime.timedelta(
+            seconds=tasks.LEASE + 1))
+        self.assertEqual(tasks.work(until_empty=True), (1, 0))
+
+    def test_only_tasks_are_run(self):
+        Job.objects.create(name='os.system', payload='[["true"], {}]')
+        with self.assertLogs('core.tasks', 'ERROR') as logs:
+            self.assertEqual(tasks.work(until_empty=True), (0, 1))
+        self.assertIn('не объявлена как задача', logs.output[0])
+
+    @override_settings(
+        EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+        TASK_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_queued_email(self):
+        mail.send_mail('Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru'],
+                       html_message='<p>Текст</p>')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().name, 'core.mail.send_email')
+        tasks.work(until_empty=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@yatube.ru'])
+        self.assertEqual(mail.outbox[0].alternatives,
+                         [('<p>Текст</p>', 'text/html')])
+
+    def test_run_worker_command(self):
+        remember.delay(1)
+        out = io.StringIO()
+        call_command('run_worker', '--once', stdout=out)
+        self.assertIn('Выполнено задач: 1, с ошибкой: 0', out.getvalue())
+
+
+@override_settings(RATE_LIMITS={'users:login': '2/m'})
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('users:login')
+
+    def login(self, username, address='10.0.0.1'):
+        return self.client.post(
+            self.url, {'username': username, 'password': 'wrong'},
+            REMOTE_ADDR=address)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('5/2h'), (5, 7200))
+
+    def test_bucket_refills_evenly(self):
+        self.assertEqual(consume('test', {'a': '2/m'}, now=0), 0)
+        self.assertEqual(consume('test', {'a': '2/m'}, now=0), 0)
+        self.assertEqual(consume('test', {'a': '2/m'}, now=0), 30)
+        self.assertEqual(consume('test', {'a': '2/m'}, now=30), 0)
+        self.assertEqual(consume('test', {'b': '2/m'}, now=30), 0)
+
+    def test_denied_request_spends_no_tokens(self):
+        consume('test', {'a': '1/m'}, now=0)
+        self.assertEqual(consume('test', {'a': '1/m', 'b': '1/m'},
+                                 now=0), 60)
+        self.assertEqual(consume('test', {'b': '1/m'}, now=0), 0)
+
+    def test_limit_per_address(self):
+        for name in ('one', 'two'):
+            self.assertEqual(self.login(name).status_code, 200)
+        response = self.login('three')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.login('three', '10.0.0.2').status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(RATE_LIMITS={'users:login': '2/m',
+                                    'users:login:account': '3/m'})
+    def test_limit_per_user(self):
+        for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            self.assertEqual(self.login('victim', address).status_code, 200)
+        self.assertEqual(self.login('Victim', '10.0.0.4').status_code, 429)
+
+    def test_one_address_cannot_lock_out_account(self):
+        User.objects.create_user('victim', password='s3cret-pass')
+        for _ in range(30):
+            self.login('victim')
+        self.assertEqual(self.login('victim').status_code, 429)
+        response = Client().post(
+            self.url, {'username': 'victim', 'password': 's3cret-pass'},
+            REMOTE_ADDR='10.0.0.2')
+        self.assertRedirects(response, reverse('posts:index'),
+                             fetch_redirect_response=False)
+
+    def test_account_rate_defaults_to_larger_limit(self):
+        self.assertEqual(account_rate({}, 'users:login', '2/m'), '20/60s')
+        self.assertEqual(account_rate(
+            {'users:login:account': '5/h'}, 'users:login', '2/m'), '5/h')
+
+    def test_authorized_user_is_limited_by_account(self):
+        user = User.objects.create_user('author')
+        self.client.force_login(user)
+        create = reverse('posts:post_create')
+        with override_settings(RATE_LIMITS={'posts:post_create': '1/h'}):
+            self.client.post(create, {'text': 'Пост'}, REMOTE_ADDR='1.1.1.1')
+            response = self.client.post(create, {'text': 'Ещё пост'},
+                                        REMOTE_ADDR='2.2.2.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Post.objects.count(), 1)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['core.hashers.PBKDF2PasswordHasher'],
+    PBKDF2_ITERATIONS=100)
+class PasswordHasherTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_iterations_from_settings(self):
+        user = User.objects.create_user('reader', password='s3cret-pass')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$100$'))
+
+    def test_password_rehashed_on_login(self):
+        with override_settings(PASSWORD_HASHERS=[
+                'django.contrib.auth.hashers.MD5PasswordHasher']):
+            user = User.objects.create_user('reader', password='s3cret-pass')
+        with override_settings(PASSWORD_HASHERS=[
+                'core.hashers.PBKDF2PasswordHasher',
+                'django.contrib.auth.hashers.MD5PasswordHasher']):
+            self.client.post(reverse('users:login'), {
+                'username': 'reader', 'password': 's3cret-pass'})
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$100$'))
+        with self.settings(PBKDF2_ITERATIONS=200):
+            self.client.post(reverse('users:login'), {
+                'username': 'reader', 'password': 's3cret-pass'})
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$200$'))
+        self.assertTrue(user.check_password('s3cret-pass'))
+
+    def test_hash_timings_command(self):
+        out = io.StringIO()
+        call_command('hash_timings', '--repeat', '1', stdout=out)
+        self.assertIn('pbkdf2_sha256: хэш', out.getvalue())
+        self.assertIn('(iterations=100)', out.getvalue())
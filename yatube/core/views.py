@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from .perf import snapshot
+
+
+@staff_member_required
+def perf_stats(request):
+    return JsonResponse(snapshot(), json_dumps_params={'indent': 2})
+
+
+def media(request, path):
+    """Отдаёт загрузки и миниатюры с долгим кэшированием в браузере."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(response, public=True, immutable=True,
+                        max_age=settings.MEDIA_CACHE_SECONDS)
+    return response
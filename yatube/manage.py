@@ -3,9 +3,15 @@
 import os
 import sys
 
+# Команды, которым хватает быстрого хэшера паролей (yatube.settings_test).
+TEST_COMMANDS = ('test', 'bench')
+
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    settings = 'yatube.settings'
+    if sys.argv[1:2] and sys.argv[1] in TEST_COMMANDS:
+        settings = 'yatube.settings_test'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
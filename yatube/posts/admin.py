@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
-from .models import Group, Post
+from .models import Comment, Follow, Group, Post
+from .search import matching_ids_sql
 
 # Register your models here.
 
@@ -12,12 +14,33 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через полнотекстовый индекс, а не LIKE.
+        if not search_term.strip():
+            return queryset, False
+        sql, params = matching_ids_sql(search_term, queryset.db)
+        return queryset.filter(pk__in=RawSQL(sql, params)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'title', 'slug', 'description',)
+    list_display = ('pk', 'title', 'slug', 'description', 'post_count',)
     search_fields = ('title',)
     empty_value_display = '-пусто-'
 
 
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author',)
+    search_fields = ('user__username', 'author__username',)
+    raw_id_fields = ('user', 'author',)
+
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'post', 'author', 'created',)
+    search_fields = ('author__username',)
+    raw_id_fields = ('post', 'author',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(Follow, FollowAdmin)
+admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,96 @@
+import hashlib
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_safe
+from sorl.thumbnail import get_thumbnail
+
+from .models import Group, Post, User
+from .pagecache import feed_version
+from .paginators import InvalidCursor, KeysetPaginator
+from .thumbnails import CARD_GEOMETRY, CARD_OPTIONS
+from .views import POSTS_QUANTITY
+
+FIELDS = ('pk', 'text', 'pub_date', 'image', 'author__username',
+          'author__first_name', 'author__last_name', 'group__slug',
+          'group__title', 'comment_count')
+
+
+def _etag(feed):
+    """ETag страницы по поколению ленты: 304 без запросов к базе."""
+    def etag(request, **kwargs):
+        version = feed_version(feed.format(**kwargs))
+        return hashlib.md5(
+            f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+    return etag
+
+
+def feed_api(feed):
+    """Общие обёртки JSON-ленты: только GET, ETag и gzip."""
+    def decorator(view):
+        return gzip_page(require_safe(condition(etag_func=_etag(feed))(view)))
+    return decorator
+
+
+def _image(name):
+    if not name:
+        return None
+    return get_thumbnail(name, CARD_GEOMETRY, **CARD_OPTIONS).url
+
+
+def _item(row):
+    full_name = f"{row['author__first_name']} {row['author__last_name']}"
+    return {
+        'id': row['pk'],
+        'url': reverse('posts:post_detail', args=(row['pk'],)),
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'image': _image(row['image']),
+        'comment_count': row['comment_count'],
+        'author': {
+            'username': row['author__username'],
+            'full_name': full_name.strip(),
+        },
+        'group': row['group__slug'] and {
+            'slug': row['group__slug'],
+            'title': row['group__title'],
+        },
+    }
+
+
+def feed_response(request, posts):
+    """Страница ленты в JSON со ссылкой на следующую по курсору."""
+    paginator = KeysetPaginator(posts.values(*FIELDS), POSTS_QUANTITY)
+    cursor = request.GET.get('cursor')
+    try:
+        page = paginator.cursor_page(cursor) if cursor else None
+    except InvalidCursor:
+        page = None
+    if page is None:
+        page = paginator.first_page()
+    next_url = None
+    if page.next_cursor:
+        next_url = f'{request.path}?cursor={page.next_cursor}'
+    return JsonResponse({
+        'results': [_item(row) for row in page],
+        'next': next_url,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@feed_api('index')
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@feed_api('group:{slug}')
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed_response(request, Post.objects.filter(group=group))
+
+
+@feed_api('author:{username}')
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_response(request, Post.objects.filter(author=author))
@@ -0,0 +1,566 @@
+import asyncio
+import io
+import logging
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, reset_queries
+from django.template import Engine, RequestContext, Template, engines
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, ContextList
+from django.urls import resolve, reverse
+from django.utils.crypto import get_random_string
+from faker import Faker
+
+from core.asgi import ASGIHandler, environ_from_scope
+from core.ratelimit import RateLimitMiddleware
+from core.tasks import enqueue, task, work
+from core.template_cache import referenced_templates
+from . import follow
+from .counters import recount
+from .models import Follow, Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+PAGES = 5
+
+
+def _pick_authors(rnd, user_ids, weights, user_id, count):
+    picked = set()
+    count = min(count, len(user_ids) - 1)
+    while len(picked) < count:
+        author_id = rnd.choices(user_ids, weights)[0]
+        if author_id != user_id:
+            picked.add(author_id)
+    return picked
+
+
+def seed(users, groups, posts, seed=0, follows=0, skew=0.0):
+    """Заполняет базу тестовыми данными и возвращает их ключи.
+
+    Каждый пользователь подписывается на ``follows`` авторов. При
+    ``skew = 0`` авторы выбираются равномерно (длинный хвост), при
+    ``skew > 0`` — по закону Ципфа: первые авторы собирают почти всех
+    подписчиков и становятся знаменитостями.
+    """
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rnd = random.Random(seed)
+    password = make_password(None)
+    User.objects.bulk_create(
+        (User(username=f'bench{i}', first_name=fake.first_name(),
+              last_name=fake.last_name(), password=password)
+         for i in range(users)),
+        batch_size=BATCH_SIZE,
+    )
+    Group.objects.bulk_create(
+        (Group(title=fake.sentence(nb_words=3), slug=f'bench-{i}',
+               description=fake.text(max_nb_chars=200))
+         for i in range(groups)),
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.filter(
+        username__startswith='bench').values_list('pk', flat=True))
+    group_ids = list(Group.objects.filter(
+        slug__startswith='bench-').values_list('pk', flat=True))
+    Post.objects.bulk_create(
+        (Post(text=fake.text(max_nb_chars=400),
+              author_id=rnd.choice(user_ids),
+              group_id=rnd.choice(group_ids + [None]))
+         for _ in range(posts)),
+        batch_size=BATCH_SIZE,
+    )
+    recount()
+    if follows:
+        weights = [1 / (rank + 1) ** skew for rank in range(len(user_ids))]
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id in user_ids
+             for author_id in _pick_authors(
+                 rnd, user_ids, weights, user_id, follows)),
+            batch_size=BATCH_SIZE,
+        )
+        follow.rebuild()
+    for cache in caches.all():
+        cache.clear()
+    words = set()
+    for text in Post.objects.values_list('text', flat=True)[:100]:
+        words.update(word for word in re.findall(r'\w+', text.lower())
+                     if len(word) > 3)
+    return {
+        'words': sorted(words),
+        'users': list(User.objects.filter(
+            pk__in=user_ids).values_list('username', flat=True)),
+        'groups': list(Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True)),
+        'posts': list(Post.objects.values_list('pk', flat=True)),
+    }
+
+
+def _page(rnd):
+    page = rnd.randint(1, PAGES)
+    return {'page': page} if page > 1 else {}
+
+
+def _index(dataset, rnd):
+    return 'get', reverse('posts:index'), _page(rnd)
+
+
+def _group_posts(dataset, rnd):
+    slug = rnd.choice(dataset['groups'])
+    return 'get', reverse('posts:group_list', args=(slug,)), _page(rnd)
+
+
+def _profile(dataset, rnd):
+    username = rnd.choice(dataset['users'])
+    return 'get', reverse('posts:profile', args=(username,)), _page(rnd)
+
+
+def _post_detail(dataset, rnd):
+    post_id = rnd.choice(dataset['posts'])
+    return 'get', reverse('posts:post_detail', args=(post_id,)), {}
+
+
+def _follow_index(dataset, rnd):
+    return 'get', reverse('posts:follow_index'), {}
+
+
+def _search(dataset, rnd):
+    return 'get', reverse('posts:search'), {
+        'q': rnd.choice(dataset['words'])}
+
+
+def _post_create(dataset, rnd):
+    return 'post', reverse('posts:post_create'), {
+        'text': f'Пост нагрузочного теста {rnd.random()}'}
+
+
+def _read_write(dataset, rnd):
+    # Каждый пятый запрос пишет, остальные читают ленты и посты.
+    if rnd.random() < 0.2:
+        return _post_create(dataset, rnd)
+    return rnd.choice((_index, _profile, _post_detail))(dataset, rnd)
+
+
+SCENARIOS = {
+    'index': (_index, False),
+    'group_posts': (_group_posts, False),
+    'profile': (_profile, False),
+    'post_detail': (_post_detail, False),
+    'search': (_search, False),
+    'follow_index': (_follow_index, True),
+    'post_create': (_post_create, True),
+    'read_write': (_read_write, True),
+}
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def run_scenario(name, dataset, requests, concurrency=1, authorized=False,
+                 seed=0, revalidate=False):
+    """Прогоняет сценарий и возвращает сводку по задержкам и запросам.
+
+    С ``revalidate`` клиент, как браузер, запоминает ETag страниц и
+    переспрашивает их с If-None-Match: в сводке видно, сколько ответов
+    ушло 304 и сколько байт и процессорного времени это сэкономило.
+    """
+    build, needs_login = SCENARIOS[name]
+    login = authorized or needs_login
+    user = User.objects.get(username=dataset['users'][0]) if login else None
+    local = threading.local()
+
+    def get_client():
+        if not hasattr(local, 'client'):
+            local.client = Client()
+            local.etags = {}
+            if user is not None:
+                local.client.force_login(user)
+        return local.client
+
+    def request(number):
+        method, url, data = build(dataset, random.Random(seed + number))
+        client = get_client()
+        key = (url, urlencode(data))
+        headers = {}
+        if revalidate and method == 'get' and key in local.etags:
+            headers['HTTP_IF_NONE_MATCH'] = local.etags[key]
+        # Журнал запросов ограничен 9000 записями: полный журнал после
+        # большого seed не даёт CaptureQueriesContext ничего насчитать.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                response = getattr(client, method)(url, data, **headers)
+            except Exception:
+                # Тестовый клиент пробрасывает исключение view; сервер
+                # ответил бы 500, и прогон должен дойти до сводки.
+                logger.exception('Запрос %s %s упал', method.upper(), url)
+                return (time.perf_counter() - started, len(queries), 500,
+                        0)
+            elapsed = time.perf_counter() - started
+        if response.has_header('ETag'):
+            local.etags[key] = response['ETag']
+        return (elapsed, len(queries), response.status_code,
+                len(response.content))
+
+    started = time.perf_counter()
+    cpu = time.process_time()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(request, range(requests)))
+    else:
+        results = [request(number) for number in range(requests)]
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - started
+    summary = _summary(
+        [(elapsed, status) for elapsed, _, status, _ in results], wall,
+        [count for _, count, _, _ in results])
+    summary.update({
+        'not_modified': sum(status == 304 for _, _, status, _ in results),
+        'bytes_per_request': sum(size for *_, size in results) / requests,
+        'cpu_ms_per_request': cpu * 1000 / requests,
+    })
+    return summary
+
+
+def _summary(results, wall, queries=None):
+    latencies = sorted(elapsed * 1000 for elapsed, _ in results)
+    return {
+        'requests': len(results),
+        'errors': sum(status >= 400 for _, status in results),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'throughput_rps': len(results) / wall if wall else None,
+        'queries_per_request': (
+            sum(queries) / len(queries) if queries else None),
+    }
+
+
+def _scope(method, url, data, cookies):
+    """ASGI scope и тело запроса; POST получает CSRF-токен в cookie."""
+    cookies = dict(cookies)
+    headers = [(b'host', b'testserver')]
+    query, body = urlencode(data), b''
+    if method == 'post':
+        token = get_random_string(32)
+        cookies[settings.CSRF_COOKIE_NAME] = token
+        headers += [
+            (b'x-csrftoken', token.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+        ]
+        query, body = '', query.encode()
+        headers.append((b'content-length', str(len(body)).encode()))
+    if cookies:
+        headers.append((b'cookie', '; '.join(
+            f'{name}={value}' for name, value in cookies.items()).encode()))
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method.upper(),
+        'scheme': 'http',
+        'path': url,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': headers,
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }, body
+
+
+def _serve_wsgi(application, request, delay):
+    # Поток сервера занят, пока медленный клиент шлёт запрос и читает ответ.
+    scope, body = request
+    time.sleep(delay)
+    status = []
+    response = application(
+        environ_from_scope(scope, io.BytesIO(body)),
+        lambda line, headers, exc_info=None: status.append(line))
+    try:
+        for _ in response:
+            time.sleep(delay)
+    finally:
+        response.close()
+    return int(status[0].split(' ', 1)[0])
+
+
+async def _serve_asgi(application, request, delay):
+    scope, body = request
+    status = []
+
+    async def receive():
+        await asyncio.sleep(delay)
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message.get('body'):
+            await asyncio.sleep(delay)
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def run_served(name, dataset, requests, server, concurrency=16, workers=4,
+               client_delay=0.05, authorized=False, seed=0):
+    """Прогоняет сценарий через WSGI или ASGI с медленными клиентами.
+
+    ``concurrency`` клиентов шлют запросы подряд, каждый тратит
+    ``client_delay`` секунд на отправку запроса и на чтение ответа.
+    Оба сервера обрабатывают запросы в ``workers`` потоках.
+    """
+    build, needs_login = SCENARIOS[name]
+    cookies = {}
+    if authorized or needs_login:
+        client = Client()
+        client.force_login(User.objects.get(username=dataset['users'][0]))
+        cookies = {name: morsel.value
+                   for name, morsel in client.cookies.items()}
+    scopes = [_scope(*build(dataset, random.Random(seed + number)), cookies)
+              for number in range(requests)]
+    if server == 'wsgi':
+        results, wall = _run_wsgi(scopes, concurrency, workers, client_delay)
+    elif server == 'asgi':
+        results, wall = asyncio.run(
+            _run_asgi(scopes, concurrency, workers, client_delay))
+    else:
+        raise ValueError(f'Неизвестный сервер: {server}')
+    return _summary(results, wall)
+
+
+def _run_wsgi(scopes, concurrency, workers, delay):
+    application = WSGIHandler()
+    pending = iter(scopes)
+    lock = threading.Lock()
+    results = []
+    with ThreadPoolExecutor(workers) as server:
+        def client():
+            while True:
+                with lock:
+                    scope = next(pending, None)
+                if scope is None:
+                    return
+                started = time.perf_counter()
+                status = server.submit(
+                    _serve_wsgi, application, scope, delay).result()
+                with lock:
+                    results.append((time.perf_counter() - started, status))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as clients:
+            for future in [clients.submit(client)
+                           for _ in range(concurrency)]:
+                future.result()
+        return results, time.perf_counter() - started
+
+
+async def _run_asgi(scopes, concurrency, workers, delay):
+    application = ASGIHandler(WSGIHandler(), workers)
+    pending = iter(scopes)
+    results = []
+
+    async def client():
+        for scope in pending:
+            started = time.perf_counter()
+            status = await _serve_asgi(application, scope, delay)
+            results.append((time.perf_counter() - started, status))
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    finally:
+        application.executor.shutdown(wait=True)
+    return results, time.perf_counter() - started
+
+
+def _get(name):
+    return lambda dataset, rnd: ('get', reverse(name), {})
+
+
+# Страница, на которой рендерится шаблон, для снятия его контекста.
+TEMPLATE_PAGES = {
+    'posts/index.html': _index,
+    'posts/group_list.html': _group_posts,
+    'posts/profile.html': _profile,
+    'posts/post_detail.html': _post_detail,
+    'posts/search.html': _search,
+    'posts/create_post.html': _get('posts:post_create'),
+    'about/author.html': _get('about:author'),
+    'about/tech.html': _get('about:tech'),
+    'users/login.html': _get('users:login'),
+    'users/signup.html': _get('users:signup'),
+}
+
+
+def _template_engine(cached):
+    base = engines['django'].engine
+    loaders = ['django.template.loaders.filesystem.Loader',
+               'django.template.loaders.app_directories.Loader']
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return Engine(dirs=base.dirs, context_processors=base.context_processors,
+                  loaders=loaders, libraries=base.libraries)
+
+
+def _plain_render(template, context):
+    return template.nodelist.render(context)
+
+
+def _timed(function, repeat):
+    # Тестовое окружение подменяет Template._render и копирует контекст
+    # каждого шаблона; замер идёт с обычным рендерингом Django.
+    instrumented = Template._render
+    Template._render = _plain_render
+    try:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - started) * 1000 / repeat
+    finally:
+        Template._render = instrumented
+
+
+def run_templates(dataset, repeat=50, seed=0):
+    """Время разбора и рендеринга шаблонов, мс на один раз.
+
+    ``parse_ms`` — разбор самого шаблона, без родителя и include.
+    Для шаблонов страниц ``render_ms`` — рендеринг с cached loader,
+    где всё уже разобрано, ``uncached_ms`` — загрузка и рендеринг без
+    него: так каждый запрос разбирает страницу, base.html и include.
+    Контекст берётся из настоящего запроса залогиненного клиента.
+    """
+    cached, uncached = _template_engine(True), _template_engine(False)
+    results = {
+        name: {'parse_ms': _timed(
+            lambda: Template(template.source, template.origin, name, cached),
+            repeat)}
+        for name, template in sorted(referenced_templates(cached).items())
+    }
+    client = Client()
+    client.force_login(User.objects.get(username=dataset['users'][0]))
+    for name, build in TEMPLATE_PAGES.items():
+        _, url, data = build(dataset, random.Random(seed))
+        response = client.get(url, data)
+        request = response.wsgi_request
+        context = response.context
+        if isinstance(context, ContextList):
+            context = context[0]
+        context = context.flatten()
+        template = cached.get_template(name)
+        results[name].update({
+            'render_ms': _timed(lambda: template.render(
+                RequestContext(request, context)), repeat),
+            'uncached_ms': _timed(lambda: uncached.get_template(name).render(
+                RequestContext(request, context)), repeat),
+        })
+    return results
+
+
+@task
+def _noop(number):
+    """Пустая задача: замеряется только сама очередь."""
+
+
+def run_worker():
+    """Выполняет накопившиеся задачи и замеряет скорость воркера."""
+    started = time.perf_counter()
+    done, failed = work(until_empty=True)
+    wall = time.perf_counter() - started
+    return {
+        'jobs': done + failed,
+        'failed': failed,
+        'jobs_per_s': (done + failed) / wall if wall else None,
+    }
+
+
+def run_queue(jobs):
+    """Задержка постановки пустых задач и скорость их выполнения."""
+    eager = settings.TASKS_EAGER
+    settings.TASKS_EAGER = False
+    try:
+        latencies = []
+        for number in range(jobs):
+            started = time.perf_counter()
+            enqueue(_noop, (number,))
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        return {
+            'enqueue_p50_ms': percentile(latencies, 50),
+            'enqueue_p95_ms': percentile(latencies, 95),
+            'enqueue_p99_ms': percentile(latencies, 99),
+            'worker': run_worker(),
+        }
+    finally:
+        settings.TASKS_EAGER = eager
+
+
+def run_ratelimit(repeat=10000):
+    """Время проверки RateLimitMiddleware на запрос, мкс.
+
+    ``get`` — безопасный метод, ``unlisted`` — POST к view без лимита,
+    ``allowed`` и ``denied`` — вход с запасом токенов и с пустой
+    корзиной.
+    """
+    middleware = RateLimitMiddleware(lambda request: None)
+    url = reverse('users:login')
+    cases = {
+        'get': ('get', url, '1/d'),
+        'unlisted': ('post', reverse('posts:index'), '1/d'),
+        'allowed': ('post', url, f'{repeat * 10}/s'),
+        'denied': ('post', url, '1/d'),
+    }
+    limits = settings.RATE_LIMITS
+    results = {}
+    try:
+        for case, (method, path, rate) in cases.items():
+            settings.RATE_LIMITS = {'users:login': rate}
+            request = getattr(RequestFactory(), method)(
+                path, {'username': case, 'password': '-'})
+            request.user = AnonymousUser()
+            match = resolve(path)
+            request.resolver_match = match
+            started = time.perf_counter()
+            for _ in range(repeat):
+                middleware.process_view(request, match.func, match.args,
+                                        match.kwargs)
+            results[f'{case}_us'] = (
+                (time.perf_counter() - started) * 10 ** 6 / repeat)
+    finally:
+        settings.RATE_LIMITS = limits
+    return results
+
+
+def compare(report, baseline):
+    """Относительное изменение метрик по сравнению с прошлым отчётом."""
+    changes = {}
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        changes[name] = {
+            metric: (result[metric] - before[metric]) / before[metric]
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps',
+                           'queries_per_request', 'bytes_per_request',
+                           'cpu_ms_per_request')
+            if before.get(metric) and result.get(metric) is not None
+        }
+    return changes
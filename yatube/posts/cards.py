@@ -0,0 +1,77 @@
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from core.db import on_commit
+from core.perf import record_cache
+
+CARD_TEMPLATE = 'includes/post_card.html'
+CARD_TIMEOUT = 60 * 60 * 24
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'POST_CARD_CACHE', 'default')]
+
+
+def _version_key(kind, pk):
+    return f'post-card:v:{kind}:{pk}'
+
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+    record_cache(event == 'hits')
+
+
+def card_stats():
+    """Попадания и промахи кэша карточек в текущем процессе."""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def bump(kind, pk):
+    """Сбрасывает карточки, зависящие от поста, группы или автора.
+
+    Внутри транзакции — после её коммита.
+    """
+    on_commit(lambda: _cache().set(
+        _version_key(kind, pk), uuid.uuid4().hex[:12], None))
+
+
+def _versions(post):
+    cache = _cache()
+    keys = [
+        _version_key('post', post.pk),
+        _version_key('user', post.author_id),
+        _version_key('group', post.group_id),
+    ]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex[:12], None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def render_card(post, template_name=CARD_TEMPLATE):
+    cache = _cache()
+    key = (f'post-card:{template_name}:{get_language()}:'
+           f'{post.pk}:{_versions(post)}')
+    card = cache.get(key)
+    if card is None:
+        _count('misses')
+        card = render_to_string(template_name, {'post': post})
+        cache.set(key, card, getattr(settings, 'POST_CARD_TIMEOUT',
+                                     CARD_TIMEOUT))
+    else:
+        _count('hits')
+    return mark_safe(card)
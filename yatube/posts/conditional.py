@@ -0,0 +1,57 @@
+import hashlib
+
+from django.shortcuts import render
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
+
+from .pagecache import feed_version
+
+
+def _etag(request, feed, posts):
+    """ETag страницы с постами ``posts``.
+
+    Учитывает посты страницы и их ``updated_at``, поколение ленты
+    (переименования, счётчики, готовые миниатюры), адрес страницы
+    и пользователя: шапка и кнопки зависят от того, кто смотрит.
+    Залогиненному пользователю страница показывает формы с CSRF-токеном,
+    который меняется при входе: без токена в ETag браузер после
+    повторного входа получил бы 304 и отправил форму со старым токеном.
+    Last-Modified не отдаётся: по времени изменения постов нельзя
+    заметить смену поколения ленты, и If-Modified-Since получал бы
+    устаревший 304.
+    """
+    stamps = [(post.pk, post.updated_at.timestamp()) for post in posts]
+    csrf = None
+    if request.user.is_authenticated:
+        csrf = request.META.get('CSRF_COOKIE')
+    return quote_etag(hashlib.md5(repr((
+        feed_version(feed), request.user.pk, csrf, request.get_full_path(),
+        stamps)).encode()).hexdigest())
+
+
+def _set_validators(response, etag):
+    response['ETag'] = etag
+    # Браузер каждый раз переспрашивает сервер, а не угадывает свежесть
+    # страницы сам.
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def render_conditional(request, template, context, feed, posts):
+    """Рендерит страницу или отвечает 304 без рендеринга шаблона.
+
+    ``posts`` — посты, показанные на странице: они уже загружены view,
+    так что проверка If-None-Match не стоит запросов.
+    """
+    etag = _etag(request, feed, posts)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        csrf = request.META.get('CSRF_COOKIE')
+        response = render(request, template, context)
+        if request.META.get('CSRF_COOKIE') != csrf:
+            # Шаблон выдал первый токен сессии: ETag с ним совпадёт
+            # со следующим запросом, который принесёт этот токен в cookie.
+            etag = _etag(request, feed, posts)
+    return _set_validators(response, etag)
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post, Profile
+
+
+def shift_author(user_id, delta):
+    updated = Profile.objects.filter(user_id=user_id).update(
+        post_count=Greatest(F('post_count') + delta, 0))
+    if not updated and delta > 0:
+        # Профиль заводится при первом посте и сразу получает точное число.
+        Profile.objects.get_or_create(
+            user_id=user_id,
+            defaults={'post_count': Post.objects.filter(
+                author_id=user_id).count()},
+        )
+
+
+def shift_followers(author_id, delta):
+    updated = Profile.objects.filter(user_id=author_id).update(
+        follower_count=Greatest(F('follower_count') + delta, 0))
+    if not updated and delta > 0:
+        Profile.objects.get_or_create(
+            user_id=author_id,
+            defaults={
+                'post_count': Post.objects.filter(author_id=author_id).count(),
+                'follower_count': Follow.objects.filter(
+                    author_id=author_id).count(),
+            },
+        )
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(
+            post_count=Greatest(F('post_count') + delta, 0))
+
+
+def shift_comments(post_id, delta):
+    # Число комментариев видно на странице поста и в карточках лент,
+    # поэтому меняется и дата изменения поста для условных запросов.
+    return Post.objects.filter(pk=post_id).update(
+        comment_count=Greatest(F('comment_count') + delta, 0),
+        updated_at=timezone.now())
+
+
+def _actual_counts(field):
+    return dict(
+        Post.objects.order_by().values_list(field).annotate(Count('pk'))
+    )
+
+
+def _repair(queryset, key, actual):
+    fixed = 0
+    for obj in queryset.iterator():
+        total = actual.pop(getattr(obj, key), 0)
+        if obj.post_count != total:
+            queryset.filter(pk=obj.pk).update(post_count=total)
+            fixed += 1
+    return fixed
+
+
+@transaction.atomic
+def recount():
+    """Сверяет счётчики с таблицей постов и возвращает число исправлений."""
+    authors = _actual_counts('author')
+    fixed = _repair(Profile.objects.all(), 'user_id', authors)
+    Profile.objects.bulk_create(
+        Profile(user_id=user_id, post_count=total)
+        for user_id, total in authors.items()
+    )
+    groups = _actual_counts('group')
+    groups.pop(None, None)
+    fixed += _repair(Group.objects.all(), 'pk', groups)
+    return fixed + len(authors) + _repair_comments()
+
+
+def _repair_comments():
+    actual = dict(
+        Comment.objects.order_by().values_list('post').annotate(Count('pk')))
+    posts = Post.objects.filter(
+        Q(comment_count__gt=0) | Q(pk__in=Comment.objects.values('post')))
+    fixed = 0
+    for pk, count in posts.values_list('pk', 'comment_count').iterator():
+        total = actual.get(pk, 0)
+        if count != total:
+            shift_comments(pk, total - count)
+            fixed += 1
+    return fixed
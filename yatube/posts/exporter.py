@@ -0,0 +1,78 @@
+import csv
+import datetime
+import json
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Post
+
+CHUNK_SIZE = 2000
+FIELDS = ('id', 'text', 'pub_date', 'author', 'group')
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def parse_moment(value, end=False):
+    """Дата или дата со временем из фильтра.
+
+    С ``end`` значение — верхняя граница включительно, а возвращается
+    первый момент после неё: для даты начало следующего дня, для
+    даты со временем следующая микросекунда.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Некорректная дата: {value}')
+        moment = datetime.datetime.combine(day, datetime.time.min)
+        if end:
+            moment += datetime.timedelta(days=1)
+    elif end:
+        # pub_date хранится с точностью до микросекунды.
+        moment += datetime.timedelta(microseconds=1)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(since=None, until=None, author=None, group=None):
+    posts = Post.objects.order_by('pk')
+    if since:
+        posts = posts.filter(pub_date__gte=parse_moment(since))
+    if until:
+        posts = posts.filter(pub_date__lt=parse_moment(until, end=True))
+    if author:
+        posts = posts.filter(author__username=author)
+    if group:
+        posts = posts.filter(group__slug=group)
+    return posts.values_list(
+        'pk', 'text', 'pub_date', 'author__username', 'group__slug')
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _jsonl(rows):
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record['pub_date'] = record['pub_date'].isoformat()
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for pk, text, pub_date, author, group in rows:
+        yield writer.writerow(
+            (pk, text, pub_date.isoformat(), author, group or ''))
+
+
+def export_lines(data_format, chunk_size=CHUNK_SIZE, **filters):
+    """Строки выгрузки постов; база читается курсором по ``chunk_size``."""
+    rows = export_queryset(**filters).iterator(chunk_size=chunk_size)
+    return _csv(rows) if data_format == 'csv' else _jsonl(rows)
@@ -0,0 +1,199 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from core.tasks import task
+
+from .models import Follow, Inbox, Post, Profile
+from .paginators import KEYSET_ORDERING, InvalidCursor, KeysetPage
+from .paginators import KeysetPaginator
+
+FANOUT_LIMIT = 1000
+BATCH_SIZE = 500
+INBOX_ORDERING = ('pub_date', 'post_id')
+# Частей UNION ALL в одном запросе: у SQLite предел 500 частей
+# и в старых версиях 999 параметров.
+UNION_PARTS = 200
+
+
+def fanout_limit():
+    return getattr(settings, 'FOLLOW_FANOUT_LIMIT', FANOUT_LIMIT)
+
+
+def is_celebrity(author_id):
+    return Profile.objects.filter(user_id=author_id, celebrity=True).exists()
+
+
+def _insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        Inbox.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def push(post):
+    """Кладёт новый пост во входящие подписчиков автора.
+
+    Посты знаменитостей не раскладываются: их забирает чтение ленты.
+    """
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _insert(
+        Inbox(user_id=user_id, post_id=post.pk, author_id=post.author_id,
+              pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+@task
+def fan_out(post_id):
+    """Задача очереди: ``push`` для поста, если он ещё существует."""
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date').first()
+    if post is not None:
+        push(post)
+
+
+def backfill(user_id, author_id, after_pk=None):
+    """Кладёт во входящие ``user_id`` посты автора (новее ``after_pk``)."""
+    posts = Post.objects.filter(author_id=author_id)
+    if after_pk is not None:
+        posts = posts.filter(pk__gt=after_pk)
+    _insert(
+        Inbox(user_id=user_id, post_id=pk, author_id=author_id,
+              pub_date=pub_date)
+        for pk, pub_date in posts.values_list('pk', 'pub_date').iterator()
+    )
+
+
+def refill(author_ids, after_pk=None):
+    """Раскладывает посты, созданные без сигналов (импорт), по входящим."""
+    follows = Follow.objects.filter(author_id__in=author_ids).exclude(
+        author__profile__celebrity=True).values_list('user_id', 'author_id')
+    for user_id, author_id in follows:
+        backfill(user_id, author_id, after_pk)
+
+
+def _promote(author_id):
+    # Статус знаменитости не снимается: посты, которые автор написал
+    # знаменитостью, не лежат во входящих, и их пришлось бы раскладывать.
+    Profile.objects.filter(
+        user_id=author_id, celebrity=False,
+        follower_count__gte=fanout_limit(),
+    ).update(celebrity=True)
+
+
+@transaction.atomic
+def follow(user, author):
+    """Подписывает ``user`` на ``author``; ``False``, если уже подписан."""
+    if user.pk == author.pk:
+        return False
+    _, created = Follow.objects.get_or_create(user=user, author=author)
+    if not created:
+        return False
+    _promote(author.pk)
+    if not is_celebrity(author.pk):
+        backfill(user.pk, author.pk)
+    return True
+
+
+@transaction.atomic
+def unfollow(user, author):
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересчитывает подписчиков и знаменитостей и заново собирает входящие.
+
+    Нужен после смены ``FOLLOW_FANOUT_LIMIT`` и массовой загрузки
+    подписок в обход ``follow``.
+    """
+    Inbox.objects.all().delete()
+    Profile.objects.update(follower_count=0, celebrity=False)
+    totals = Follow.objects.order_by().values('author').annotate(
+        total=Count('pk'))
+    limit = fanout_limit()
+    for row in totals:
+        Profile.objects.filter(user_id=row['author']).update(
+            follower_count=row['total'], celebrity=row['total'] >= limit)
+    follows = Follow.objects.exclude(
+        author__profile__celebrity=True).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+def _after(queryset, ordering, key, limit):
+    # Строки строго после курсора, по индексу источника.
+    paginator = KeysetPaginator(queryset, limit, ordering=ordering)
+    return paginator.cursor_queryset(key) if key else paginator.object_list
+
+
+def _keys(queryset, ordering, key, limit):
+    # Ключи (pub_date, id) строго после курсора.
+    return _after(queryset, ordering, key, limit).values_list(
+        *ordering)[:limit]
+
+
+def _celebrity_keys(author_ids, key, limit):
+    """Ключи постов знаменитостей, по запросу на ``UNION_PARTS`` авторов.
+
+    Каждая часть UNION ALL — keyset-запрос по индексу
+    ``(author, pub_date, id)`` со своим LIMIT. Общий ``author__in``
+    прочитал бы все посты этих авторов после курсора и сортировал бы их.
+    SQLite не принимает LIMIT в частях составного запроса, поэтому
+    часть выбирает посты по ``id IN (...LIMIT)``, и не больше 500
+    частей в одном запросе, поэтому авторы разбиваются на пачки.
+    """
+    author_ids = list(author_ids)
+    keys = []
+    for start in range(0, len(author_ids), UNION_PARTS):
+        parts = [
+            Post.objects.filter(pk__in=_after(
+                Post.objects.filter(author_id=author_id), KEYSET_ORDERING,
+                key, limit).values('pk')[:limit]).order_by().values_list(
+                *KEYSET_ORDERING)
+            for author_id in author_ids[start:start + UNION_PARTS]
+        ]
+        keys += parts[0].union(*parts[1:], all=True)
+        # Из всех пачек нужны только первые ``limit`` ключей.
+        keys = sorted(keys)[:limit]
+    return keys
+
+
+def feed_page(user, per_page, cursor=None):
+    """Страница ленты подписок ``user`` после курсора.
+
+    Посты обычных авторов читаются из входящих по индексу
+    ``(user, pub_date, post)``, посты знаменитостей — из их лент по
+    ``(author, pub_date, id)``; каждый источник отдаёт не больше
+    страницы, и они сливаются по ключу. Переходы только вперёд.
+    """
+    paginator = KeysetPaginator(Post.objects.all(), per_page)
+    key, number = None, 1
+    if cursor:
+        try:
+            key, number, _ = paginator.decode_cursor(cursor)
+        except InvalidCursor:
+            pass
+    keys = list(_keys(Inbox.objects.filter(user=user), INBOX_ORDERING, key,
+                      per_page + 1))
+    celebrities = Follow.objects.filter(
+        user=user, author__profile__celebrity=True).values_list(
+        'author_id', flat=True)
+    keys += _celebrity_keys(celebrities, key, per_page + 1)
+    # Пост мог попасть во входящие до того, как автор стал знаменитостью.
+    keys = sorted(set(keys))[:per_page + 1]
+    ids = [pk for _, pk in keys[:per_page]]
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return KeysetPage([posts[pk] for pk in ids if pk in posts],
+                      number if key else 1, paginator,
+                      has_next=len(keys) > per_page,
+                      has_previous=key is not None)
@@ -1,13 +1,23 @@
 from django import forms
 
-from .models import Post
+from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
-        fields = ('text', 'group')
+        fields = ('text', 'group', 'image')
         help_texts = {
             'text': 'Текст нового поста',
             'group': 'Группа, к которой относится пост',
+            'image': 'Картинка к посту',
+        }
+
+
+class CommentForm(forms.ModelForm):
+    class Meta:
+        model = Comment
+        fields = ('text',)
+        help_texts = {
+            'text': 'Текст комментария',
         }
@@ -0,0 +1,244 @@
+import uuid
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.db import on_commit
+from core.perf import record_cache
+from core.routers import primary_reads
+
+from .models import Group, Post, User
+from .paginators import COUNT_LIMIT, KEYSET_ORDERING, KeysetPage
+from .paginators import InvalidCursor, KeysetPaginator
+
+WINDOW_SIZE = 100
+WINDOW_KEY = 'home-feed:window'
+GENERATION_KEY = 'home-feed:gen'
+LOCK_KEY = 'home-feed:lock'
+LOCK_TIMEOUT = 10
+
+
+def _cache():
+    return caches[getattr(settings, 'HOME_FEED_CACHE', 'default')]
+
+
+def window_size():
+    return getattr(settings, 'HOME_FEED_WINDOW', WINDOW_SIZE)
+
+
+def _new_generation():
+    return uuid.uuid4().hex[:12]
+
+
+def _sort_key(row):
+    return row['pub_date'], row['pk']
+
+
+def _row(post):
+    """Всё, что нужно карточке поста, без обращения к базе."""
+    group = post.group
+    return {
+        'pk': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'image': post.image.name,
+        'comment_count': post.comment_count,
+        'author': {
+            'pk': post.author.pk,
+            'username': post.author.username,
+            'first_name': post.author.first_name,
+            'last_name': post.author.last_name,
+        },
+        'group': group and {
+            'pk': group.pk,
+            'slug': group.slug,
+            'title': group.title,
+        },
+    }
+
+
+def _post(row):
+    post = Post(pk=row['pk'], text=row['text'], pub_date=row['pub_date'],
+                image=row['image'], author_id=row['author']['pk'],
+                comment_count=row.get('comment_count', 0))
+    post.author = User(**row['author'])
+    post.group = row['group'] and Group(**row['group'])
+    return post
+
+
+def _reset():
+    _cache().set(GENERATION_KEY, _new_generation(), None)
+
+
+def reset():
+    """Делает окно устаревшим: его пересоберут при следующем чтении.
+
+    Внутри транзакции — после её коммита, как и изменения окна ниже.
+    """
+    on_commit(_reset)
+
+
+def _update(change):
+    """Применяет ``change`` к окну под блокировкой.
+
+    Если окно занято другим процессом, оно просто сбрасывается:
+    пересборка из базы дешевле, чем риск потерять изменение.
+    """
+    if not window_size():
+        return
+    cache = _cache()
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        _reset()
+        return
+    try:
+        found = cache.get_many([GENERATION_KEY, WINDOW_KEY])
+        window = found.get(WINDOW_KEY)
+        if window is None or window['gen'] != found.get(GENERATION_KEY):
+            return
+        change(window)
+        window['gen'] = _new_generation()
+        cache.set_many({GENERATION_KEY: window['gen'], WINDOW_KEY: window},
+                       None)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def post_saved(post, created):
+    """Переносит новый или изменённый пост в окно, если он туда попадает."""
+    def change(window):
+        row = _row(post)
+        rows = [item for item in window['rows'] if item['pk'] != post.pk]
+        if created and window['count'] <= COUNT_LIMIT:
+            window['count'] += 1
+        if window['exhausted'] or (
+                rows and _sort_key(row) < _sort_key(rows[-1])):
+            keys = [_sort_key(item) for item in rows]
+            rows.insert(bisect_left(keys, _sort_key(row)), row)
+        size = window_size()
+        if len(rows) > size:
+            rows = rows[:size]
+            window['exhausted'] = False
+        window['rows'] = rows
+
+    on_commit(lambda: _update(change))
+
+
+def post_deleted(post):
+    def change(window):
+        window['rows'] = [
+            item for item in window['rows'] if item['pk'] != post.pk]
+        if window['count'] <= COUNT_LIMIT:
+            window['count'] = max(window['count'] - 1, 0)
+
+    on_commit(lambda: _update(change))
+
+
+def _build(cache, generation):
+    size = window_size()
+    # Окно кэшируется под текущим поколением: реплика могла ещё
+    # не получить запись, из-за которой поколение сменилось.
+    with primary_reads():
+        posts = list(Post.objects.select_related(
+            'author', 'group').order_by(*KEYSET_ORDERING)[:size + 1])
+        exhausted = len(posts) <= size
+        window = {
+            'gen': generation,
+            'rows': [_row(post) for post in posts[:size]],
+            'exhausted': exhausted,
+            'count': (len(posts) if exhausted
+                      else Post.objects.all()[:COUNT_LIMIT + 1].count()),
+        }
+    cache.set(WINDOW_KEY, window, None)
+    return window
+
+
+def get_window():
+    """Окно первых ``HOME_FEED_WINDOW`` постов главной или ``None``.
+
+    Окно хранится в кэше вместе с поколением: запись, сделанная
+    во время пересборки, меняет поколение, и собранное по старым
+    данным окно не будет использовано.
+    """
+    cache = _cache()
+    found = cache.get_many([GENERATION_KEY, WINDOW_KEY])
+    generation = found.get(GENERATION_KEY)
+    window = found.get(WINDOW_KEY)
+    if generation is not None and window is not None and (
+            window['gen'] == generation):
+        record_cache(True)
+        return window
+    record_cache(False)
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        return None
+    try:
+        if generation is None:
+            generation = _new_generation()
+            cache.set(GENERATION_KEY, generation, None)
+        return _build(cache, generation)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _page_bounds(window, per_page, number, cursor, paginator):
+    """Срез окна ``(начало, конец, номер, назад)``.
+
+    ``None`` означает, что страница выходит за окно и её надо брать
+    из базы.
+    """
+    rows = window['rows']
+    reverse = False
+    if cursor:
+        key, number, reverse = paginator.decode_cursor(cursor)
+        keys = [_sort_key(row) for row in rows]
+        if reverse:
+            end = bisect_left(keys, tuple(key))
+            # Ключ за окном: между ним и концом окна могут быть посты,
+            # которых в окне нет.
+            if not window['exhausted'] and end == len(rows):
+                return None
+            return max(end - per_page, 0), end, number, True
+        start = bisect_right(keys, tuple(key))
+    else:
+        try:
+            number = int(number or 1)
+        except (TypeError, ValueError):
+            return None
+        if number < 1:
+            return None
+        start = (number - 1) * per_page
+        # Номер за последней страницей обрабатывает обычный пагинатор.
+        if window['exhausted'] and 0 < len(rows) <= start:
+            return None
+    end = start + per_page
+    if not window['exhausted'] and end > len(rows):
+        return None
+    return start, end, number, reverse
+
+
+def page(post_list, per_page, number=None, cursor=None):
+    """Страница главной из окна или ``None``, если она лежит за окном."""
+    if not window_size():
+        return None
+    window = get_window()
+    if window is None:
+        return None
+    paginator = KeysetPaginator(post_list, per_page,
+                                bounded_count=window['count'])
+    try:
+        bounds = _page_bounds(window, per_page, number, cursor, paginator)
+    except InvalidCursor:
+        return None
+    if bounds is None:
+        return None
+    start, end, number, reverse = bounds
+    rows = window['rows']
+    posts = [_post(row) for row in rows[start:end]]
+    if reverse:
+        if not posts:
+            return None
+        return KeysetPage(posts, number if start else 1, paginator,
+                          has_next=True, has_previous=start > 0)
+    return KeysetPage(posts, number, paginator,
+                      has_next=len(rows) > end or not window['exhausted'],
+                      has_previous=number > 1)
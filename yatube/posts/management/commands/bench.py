@@ -0,0 +1,188 @@
+import json
+import os
+import subprocess
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+
+from posts.bench import (SCENARIOS, compare, run_queue, run_ratelimit,
+                         run_scenario, run_served, run_templates, run_worker,
+                         seed)
+
+SERVERS = ('client', 'wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон view на временной базе '
+            'с отчётом о задержках в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый сценарий.')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--follows', type=int, default=0,
+                            help='Подписок у каждого пользователя.')
+        parser.add_argument('--skew', type=float, default=0.0,
+                            help='Показатель Ципфа для выбора авторов; '
+                                 '0 — равномерно.')
+        parser.add_argument('--fanout-limit', type=int,
+                            help='FOLLOW_FANOUT_LIMIT на время прогона.')
+        parser.add_argument(
+            '--scenario', action='append', choices=sorted(SCENARIOS),
+            help='Сценарий прогона; по умолчанию все.')
+        parser.add_argument(
+            '--authorized', action='store_true',
+            help='Читать ленты залогиненным клиентом, мимо кэша страниц.')
+        parser.add_argument(
+            '--revalidate', action='store_true',
+            help='Клиенты переспрашивают страницы с If-None-Match.')
+        parser.add_argument(
+            '--server', action='append', choices=SERVERS,
+            help='client — тестовый клиент Django, wsgi/asgi — обработчик '
+                 'сервера с медленными клиентами; можно несколько.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков сервера для wsgi/asgi.')
+        parser.add_argument('--client-delay', type=float, default=50,
+                            help='Мс на отправку запроса и на чтение '
+                                 'ответа медленным клиентом.')
+        parser.add_argument('--templates', type=int, default=0,
+                            help='Повторов микробенчмарка шаблонов; '
+                                 '0 — не запускать.')
+        parser.add_argument(
+            '--defer-tasks', action='store_true',
+            help='Отдавать фоновые задачи очереди (TASKS_EAGER = False) '
+                 'и выполнить их воркером после сценариев.')
+        parser.add_argument('--jobs', type=int, default=0,
+                            help='Пустых задач для замера очереди; '
+                                 '0 — не запускать.')
+        parser.add_argument(
+            '--rate-limits', action='store_true',
+            help='Оставить RATE_LIMITS: без флага лимиты на время прогона '
+                 'выключены, иначе post_create упрётся в них.')
+        parser.add_argument('--ratelimit', type=int, default=0,
+                            help='Повторов замера RateLimitMiddleware; '
+                                 '0 — не запускать.')
+        parser.add_argument('--output', help='Куда записать отчёт.')
+        parser.add_argument('--compare', help='Отчёт прошлого прогона.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as report:
+                    baseline = json.load(report)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Не удалось прочитать отчёт: {error}')
+        with tempfile.TemporaryDirectory() as workdir:
+            report = self._bench(workdir, options)
+        if baseline is not None:
+            report['compare'] = compare(report, baseline)
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(data)
+        self.stdout.write(data)
+
+    def _bench(self, workdir, options):
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if connections[alias].vendor == 'sqlite':
+                # Файловая база, чтобы потоки видели общие данные
+                # и ждали блокировок, а не падали на них.
+                settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(
+                    workdir, f'{alias}.sqlite3')
+        setup_test_environment()
+        overrides = override_settings(**self._settings(options))
+        overrides.enable()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            dataset = seed(options['users'], options['groups'],
+                           options['posts'], options['seed'],
+                           options['follows'], options['skew'])
+            results = {}
+            for server in options['server'] or ('client',):
+                results.update(self._run(server, dataset, options))
+            extra = self._extra(dataset, options)
+        finally:
+            for alias in connections:
+                connections[alias].close()
+            teardown_databases(old_config, verbosity=0)
+            overrides.disable()
+            teardown_test_environment()
+        report = {
+            'commit': self._commit(),
+            'config': {
+                key: options[key] for key in (
+                    'users', 'groups', 'posts', 'requests', 'concurrency',
+                    'seed', 'follows', 'skew', 'fanout_limit', 'authorized',
+                    'revalidate', 'workers', 'client_delay', 'defer_tasks',
+                    'rate_limits')
+            },
+            'results': results,
+            **extra,
+        }
+        return report
+
+    def _settings(self, options):
+        # Настройки на время прогона; после него возвращаются прежние.
+        # Профиль тестов обновляет кэш сразу, а прогон идёт без
+        # транзакции теста: кэш обновляется после коммита, как в работе.
+        changes = {'TASKS_EAGER': not options['defer_tasks'],
+                   'CACHE_ON_COMMIT': True}
+        if options['fanout_limit'] is not None:
+            changes['FOLLOW_FANOUT_LIMIT'] = options['fanout_limit']
+        if not options['rate_limits']:
+            changes['RATE_LIMITS'] = {}
+        return changes
+
+    def _extra(self, dataset, options):
+        # Замеры вне сценариев: очередь задач, лимитер, шаблоны.
+        extra = {}
+        if options['defer_tasks']:
+            extra['deferred_tasks'] = run_worker()
+        if options['jobs']:
+            extra['queue'] = run_queue(options['jobs'])
+        if options['ratelimit']:
+            extra['ratelimit'] = run_ratelimit(options['ratelimit'])
+        if options['templates']:
+            extra['templates'] = run_templates(
+                dataset, options['templates'], options['seed'])
+        return extra
+
+    def _run(self, server, dataset, options):
+        names = options['scenario'] or SCENARIOS
+        if server == 'client':
+            return {
+                name: run_scenario(
+                    name, dataset, options['requests'],
+                    options['concurrency'], options['authorized'],
+                    options['seed'], options['revalidate'],
+                )
+                for name in names
+            }
+        return {
+            f'{name}@{server}': run_served(
+                name, dataset, options['requests'], server,
+                options['concurrency'], options['workers'],
+                options['client_delay'] / 1000, options['authorized'],
+                options['seed'],
+            )
+            for name in names
+        }
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
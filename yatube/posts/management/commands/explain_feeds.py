@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.follow import INBOX_ORDERING
+from posts.models import Group, Inbox, Post, User
+from posts.paginators import KEYSET_ORDERING, KeysetPaginator
+from posts.views import POSTS_QUANTITY
+
+
+class Command(BaseCommand):
+    help = 'Показывает план выполнения запросов ленты для каждого view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='Слаг группы для group_posts.')
+        parser.add_argument('--author', help='Имя автора для profile.')
+        parser.add_argument('--follower',
+                            help='Имя подписчика для ленты подписок.')
+        parser.add_argument(
+            '--sql', action='store_true', help='Печатать и сам SQL-запрос.')
+
+    def handle(self, *args, **options):
+        group = self._get(Group, slug=options['group'])
+        author = self._get(User, username=options['author'])
+        follower = self._get(User, username=options['follower'])
+        feeds = {'index': Post.objects.select_related('group', 'author')}
+        if group is not None:
+            feeds['group_posts'] = group.posts.select_related('author')
+        if author is not None:
+            feeds['profile'] = author.posts.all()
+        if follower is not None:
+            feeds['follow_index'] = Inbox.objects.filter(user=follower)
+        for name, queryset in feeds.items():
+            ordering = (INBOX_ORDERING if queryset.model is Inbox
+                        else KEYSET_ORDERING)
+            paginator = KeysetPaginator(queryset, POSTS_QUANTITY,
+                                        ordering=ordering)
+            first_page = paginator.object_list[:POSTS_QUANTITY]
+            self._explain(f'{name}: первая страница', first_page, options)
+            row = first_page.first()
+            if row is not None:
+                cursor_page = paginator.cursor_queryset(
+                    [getattr(row, field) for field in ordering]
+                )[:POSTS_QUANTITY + 1]
+                self._explain(f'{name}: страница по курсору', cursor_page,
+                              options)
+
+    def _get(self, model, **lookup):
+        (field, value), = lookup.items()
+        if value is None:
+            return model.objects.order_by('pk').first()
+        try:
+            return model.objects.get(**lookup)
+        except model.DoesNotExist:
+            raise CommandError(f'{model.__name__} с {field}={value} не найден')
+
+    def _explain(self, title, queryset, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        if options['sql']:
+            self.stdout.write(str(queryset.query))
+        self.stdout.write(queryset.explain())
+        self.stdout.write('')
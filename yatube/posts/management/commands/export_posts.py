@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporter import CHUNK_SIZE, FORMATS, export_lines, parse_moment
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты в JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--output', help='Файл; по умолчанию stdout.')
+        parser.add_argument(
+            '--since', help='Не раньше даты (ISO 8601), включительно.')
+        parser.add_argument(
+            '--until',
+            help=('Не позже даты (ISO 8601), включительно; дата без '
+                  'времени — весь день.'))
+        parser.add_argument('--author', help='Имя автора.')
+        parser.add_argument('--group', help='Слаг группы.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {key: options[key]
+                   for key in ('since', 'until', 'author', 'group')}
+        try:
+            parse_moment(filters['since'])
+            parse_moment(filters['until'])
+        except ValueError as error:
+            raise CommandError(error)
+        lines = export_lines(options['format'], options['chunk_size'],
+                             **filters)
+        if not options['output']:
+            self._write(lines, self.stdout)
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            self._write(lines, output)
+
+    def _write(self, lines, output):
+        for line in lines:
+            output.write(line)
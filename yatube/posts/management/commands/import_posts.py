@@ -0,0 +1,77 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from posts.importer import FORMATS, PostImporter, detect_format, read_rows
+from posts.models import ImportCheckpoint
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты из JSONL или CSV с полями text, author, '
+            'group и pub_date.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--checkpoint',
+            help='Имя записи о прогрессе; по умолчанию <path>.checkpoint.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, записанного в прогрессе.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = self._load_checkpoint(checkpoint) if options['resume'] else 0
+        if not options['resume']:
+            ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        rows = read_rows(path, options['format'] or detect_format(path))
+        rows = islice(rows, done, None)
+        importer = PostImporter()
+        created = skipped = 0
+        started = time.monotonic()
+        try:
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                # Прогресс пишется в транзакции пачки: после сбоя он
+                # не разойдётся с уже сохранёнными постами.
+                batch_created, batch_skipped = importer.import_batch(
+                    batch, lambda: self._save_checkpoint(
+                        checkpoint, path, done + len(batch)))
+                created += batch_created
+                skipped += batch_skipped
+                done += len(batch)
+                self.stdout.write(
+                    f'{done} строк, {self._rate(created, started):.0f} '
+                    f'постов/с')
+        except (ValueError, KeyError, AttributeError, DatabaseError) as error:
+            raise CommandError(
+                f'Ошибка после строки {done}: {error}. Повторите запуск '
+                f'с --resume, чтобы продолжить с неё.')
+        ImportCheckpoint.objects.filter(name=checkpoint).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано постов: {created}, пропущено строк: {skipped}, '
+            f'{self._rate(created, started):.0f} постов/с'))
+
+    def _rate(self, created, started):
+        elapsed = time.monotonic() - started
+        return created / elapsed if elapsed else 0
+
+    def _load_checkpoint(self, checkpoint):
+        return ImportCheckpoint.objects.filter(name=checkpoint).values_list(
+            'rows', flat=True).first() or 0
+
+    def _save_checkpoint(self, checkpoint, path, rows):
+        ImportCheckpoint.objects.update_or_create(
+            name=checkpoint, defaults={'source': path, 'rows': rows})
@@ -10,6 +10,8 @@ class Post(models.Model):
     text = models.TextField(verbose_name='Текст')
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата'
                                     'публикации')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
     author = models.ForeignKey(
         User,
         verbose_name='Автор',
@@ -24,20 +26,65 @@ class Post(models.Model):
         blank=True,
         related_name='posts',
     )
+    image = models.ImageField(
+        verbose_name='Картинка',
+        upload_to='posts/',
+        blank=True,
+    )
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.text[:CONSTANT_SYMBOLS]
 
+    def save(self, *args, **kwargs):
+        # Счётчик комментариев меняется только через F() в сигналах:
+        # сохранение загруженного раньше поста затёрло бы новое значение.
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comment_count'
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_counted()
+        return instance
+
+    def remember_counted(self):
+        """Запоминает автора и группу, уже учтённые в счётчиках."""
+        self._counted = (self.__dict__.get('author_id'),
+                         self.__dict__.get('group_id'))
+
     class Meta:
         verbose_name = ('Посты')
         verbose_name_plural = ('Посты')
         ordering = ['pub_date']
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['author', 'pub_date', 'id'],
+                         name='post_author_pub_date_id_idx'),
+            models.Index(fields=['group', 'pub_date', 'id'],
+                         name='post_group_pub_date_id_idx'),
+        ]
 
 
 class Group(models.Model):
     title = models.CharField(verbose_name='Заголовок', max_length=200)
     slug = models.SlugField(verbose_name='Слаг', unique=True)
     description = models.TextField(verbose_name='Описание')
+    post_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = ('Группы')
@@ -45,3 +92,151 @@ class Group(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='profile',
+    )
+    post_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+        editable=False,
+    )
+    follower_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    celebrity = models.BooleanField(
+        verbose_name='Посты забираются при чтении ленты',
+        default=False,
+        editable=False,
+    )
+
+    class Meta:
+        verbose_name = ('Профили')
+        verbose_name_plural = ('Профили')
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Follow(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='follower',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='following',
+    )
+
+    class Meta:
+        verbose_name = ('Подписки')
+        verbose_name_plural = ('Подписки')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+            models.CheckConstraint(check=~models.Q(user=models.F('author')),
+                                   name='no_self_follow'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} -> {self.author}'
+
+
+class Inbox(models.Model):
+    """Пост автора во входящих подписчика (ленте подписок)."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='inbox',
+        # Составные индексы ниже и так начинаются с подписчика.
+        db_index=False,
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = ('Входящие')
+        verbose_name_plural = ('Входящие')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_inbox_post'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='inbox_user_pub_date_post_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='inbox_user_author_idx'),
+        ]
+
+
+class Comment(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='comments',
+        # Составной индекс ниже и так начинается с поста.
+        db_index=False,
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='comments',
+    )
+    text = models.TextField(verbose_name='Текст комментария')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Дата комментария')
+
+    class Meta:
+        verbose_name = ('Комментарии')
+        verbose_name_plural = ('Комментарии')
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return self.text[:CONSTANT_SYMBOLS]
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько строк файла уже импортировано (import_posts --resume)."""
+
+    name = models.CharField(verbose_name='Файл прогресса', max_length=255,
+                            unique=True)
+    source = models.CharField(verbose_name='Источник', max_length=255)
+    rows = models.PositiveIntegerField(verbose_name='Строк', default=0)
+    updated = models.DateTimeField(verbose_name='Обновлён', auto_now=True)
+
+    class Meta:
+        verbose_name = ('Прогресс импорта')
+        verbose_name_plural = ('Прогресс импорта')
+
+    def __str__(self):
+        return f'{self.name}: {self.rows}'
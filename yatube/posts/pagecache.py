@@ -0,0 +1,125 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from core.db import on_commit
+from core.perf import record_cache
+from core.routers import primary_reads
+
+PAGE_TIMEOUT = 60 * 5
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+SITE_FEED = 'site'
+
+
+def _cache():
+    return caches[getattr(settings, 'FEED_PAGE_CACHE', 'default')]
+
+
+def _digest(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def _generation_key(feed):
+    # В именах лент бывают слаги и юникодные логины: в ключ идёт хэш.
+    return f'feed-page:gen:{_digest(feed)}'
+
+
+def bump_feeds(*feeds):
+    """Делает устаревшими закэшированные страницы перечисленных лент.
+
+    Внутри транзакции — после её коммита.
+    """
+    on_commit(lambda: _cache().set_many(
+        {_generation_key(feed): uuid.uuid4().hex[:12] for feed in feeds},
+        None,
+    ))
+
+
+def _generations(cache, feeds):
+    keys = [_generation_key(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, uuid.uuid4().hex[:12], None)
+            found[key] = cache.get(key)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def feed_version(feed):
+    """Поколение ленты и сайта; меняется после каждого ``bump_feeds``."""
+    return _generations(_cache(), (SITE_FEED, feed))
+
+
+def _revalidate(request, response):
+    # Клиент с той же версией страницы получает 304 без тела.
+    if not response.has_header('ETag'):
+        return response
+    return get_conditional_response(
+        request, etag=response['ETag'],
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response)
+
+
+def _wait_for(cache, key):
+    deadline = time.monotonic() + getattr(settings, 'FEED_PAGE_LOCK_WAIT',
+                                          LOCK_WAIT)
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        response = cache.get(key)
+        if response is not None:
+            return response
+    return None
+
+
+def cache_feed(feed):
+    """Кэширует страницу ленты для анонимных посетителей.
+
+    ``feed`` — имя ленты с подстановкой аргументов view, например
+    ``'group:{slug}'``. Ключ страницы включает поколения ленты и сайта,
+    поэтому после ``bump_feeds`` старые страницы больше не отдаются.
+    Пока одна страница рендерится, остальные запросы за ней ждут
+    результата, а не рендерят её параллельно. Страница для кэша
+    читает данные из primary.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            cache = _cache()
+            generations = _generations(
+                cache, (SITE_FEED, feed.format(**kwargs)))
+            key = (f'feed-page:{generations}:'
+                   f'{_digest(request.get_full_path())}')
+            response = cache.get(key)
+            record_cache(response is not None)
+            if response is not None:
+                return _revalidate(request, response)
+            lock = f'{key}:lock'
+            locked = cache.add(lock, 1, LOCK_TIMEOUT)
+            if not locked:
+                response = _wait_for(cache, key)
+                if response is not None:
+                    return _revalidate(request, response)
+            try:
+                # Страница попадёт в кэш под свежим поколением,
+                # поэтому собирается по primary, а не по реплике.
+                with primary_reads():
+                    response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response, getattr(
+                        settings, 'FEED_PAGE_TIMEOUT', PAGE_TIMEOUT))
+            finally:
+                if locked:
+                    cache.delete(lock)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,208 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+COUNT_LIMIT = 1000
+KEYSET_ORDERING = ('pub_date', 'pk')
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def _json_default(value):
+    # DjangoJSONEncoder обрезает микросекунды, а ключу нужна точность.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPage(Page):
+    """Страница, которая знает курсоры на соседние страницы."""
+
+    def __init__(self, object_list, number, paginator,
+                 has_next=None, has_previous=None):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def has_next(self):
+        if self._has_next is not None:
+            return self._has_next
+        paginator = self.paginator
+        return super().has_next() or (
+            not paginator.count_is_exact
+            and self.number == paginator.num_pages
+        )
+
+    def has_previous(self):
+        if self._has_previous is not None:
+            return self._has_previous
+        return super().has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+    @cached_property
+    def next_cursor(self):
+        if not self.has_next() or not len(self):
+            return None
+        return self.paginator.encode_cursor(self[len(self) - 1],
+                                            self.number + 1)
+
+    @cached_property
+    def previous_cursor(self):
+        if not self.has_previous() or not len(self):
+            return None
+        return self.paginator.encode_cursor(self[0], self.number - 1,
+                                            reverse=True)
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу сортировки вместо OFFSET.
+
+    Первая страница и ``?page=N`` работают как у обычного ``Paginator``,
+    а переходы по ``?cursor=`` фильтруют по ключу ``(pub_date, id)``
+    и не зависят от глубины страницы. Общее число записей считается
+    не дальше ``count_limit``, чтобы не сканировать всю таблицу;
+    уже известное число можно передать в ``bounded_count``.
+    """
+
+    def __init__(self, object_list, per_page, ordering=KEYSET_ORDERING,
+                 count_limit=COUNT_LIMIT, bounded_count=None, **kwargs):
+        self.ordering = tuple(ordering)
+        self.count_limit = count_limit
+        if bounded_count is not None:
+            self._bounded_count = bounded_count
+        super().__init__(object_list.order_by(*self.ordering), per_page,
+                         **kwargs)
+
+    @cached_property
+    def _bounded_count(self):
+        if self.count_limit is None:
+            return self.object_list.count()
+        return self.object_list[:self.count_limit + 1].count()
+
+    @cached_property
+    def count(self):
+        if self.count_limit is None:
+            return self._bounded_count
+        return min(self._bounded_count, self.count_limit)
+
+    @property
+    def count_is_exact(self):
+        return (self.count_limit is None
+                or self._bounded_count <= self.count_limit)
+
+    def get_page(self, number, cursor=None):
+        if cursor:
+            try:
+                return self.cursor_page(cursor)
+            except InvalidCursor:
+                pass
+        return super().get_page(number)
+
+    def first_page(self):
+        """Первая страница без подсчёта записей."""
+        rows = list(self.object_list[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], 1, self,
+                          has_next=len(rows) > self.per_page,
+                          has_previous=False)
+
+    def cursor_page(self, cursor):
+        key, number, reverse = self.decode_cursor(cursor)
+        rows = list(
+            self.cursor_queryset(key, reverse)[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not reverse:
+            return KeysetPage(rows, number, self,
+                              has_next=has_more, has_previous=number > 1)
+        if not rows:
+            return self.page(1)
+        rows.reverse()
+        return KeysetPage(rows, number if has_more else 1, self,
+                          has_next=True, has_previous=has_more)
+
+    def cursor_queryset(self, key, reverse=False):
+        """Записи строго после ключа в порядке обхода."""
+        ordering = self._reversed_ordering if reverse else self.ordering
+        return self.object_list.filter(
+            self._after(key, reverse)).order_by(*ordering)
+
+    def encode_cursor(self, obj, number, reverse=False):
+        payload = {'k': self._key(obj), 'n': number}
+        if reverse:
+            payload['r'] = 1
+        data = json.dumps(payload, default=_json_default,
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            payload = json.loads(data.decode())
+            values = payload['k']
+            if len(values) != len(self.ordering):
+                raise ValueError(cursor)
+            key = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+            number = max(int(payload.get('n', 1)), 1)
+        except (binascii.Error, ValidationError, ValueError, TypeError,
+                KeyError, AttributeError):
+            raise InvalidCursor('Некорректный курсор страницы')
+        return key, number, bool(payload.get('r'))
+
+    @cached_property
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        name = name.lstrip('-')
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _key(self, obj):
+        key = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            if isinstance(obj, dict):
+                key.append(obj.get(name, obj.get(self._field(name).attname)))
+            else:
+                key.append(getattr(obj, name))
+        return key
+
+    def _after(self, key, reverse):
+        """Условие «строго после ключа» в направлении обхода.
+
+        Нестрогое условие на первое поле дублирует OR-цепочку, чтобы
+        база искала по индексу диапазоном, а не сканировала его целиком.
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, key):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') != reverse else 'gt'
+            if not equal:
+                bound = Q(**{f'{field}__{lookup}e': value})
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return bound & condition
+
+    def _get_page(self, *args, **kwargs):
+        return KeysetPage(*args, **kwargs)
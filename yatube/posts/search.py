@@ -0,0 +1,195 @@
+import base64
+import binascii
+import json
+import re
+
+from django.db import connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+FTS_TABLE = 'posts_post_fts'
+PG_CONFIG = 'russian'
+PG_INDEX = 'posts_post_text_tsv_idx'
+SNIPPET_WORDS = 24
+# Служебные символы вокруг совпадений: HTML экранируется уже после поиска.
+MARK_START, MARK_END = '\x02', '\x03'
+
+SQLITE_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON posts_post "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON posts_post "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text "
+    f"ON posts_post BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+)
+POSTGRES_SCHEMA = (
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON posts_post "
+    f"USING GIN (to_tsvector('{PG_CONFIG}', text))",
+)
+
+
+class InvalidSearchCursor(ValueError):
+    pass
+
+
+def install(connection, rebuild=False):
+    """Создаёт поисковый индекс, если его ещё нет.
+
+    В SQLite индекс держат в актуальном состоянии триггеры на posts_post;
+    миграции, пересоздающие таблицу, их удаляют, поэтому установка
+    повторяется после каждой миграции.
+    """
+    if connection.vendor == 'sqlite':
+        statements = SQLITE_SCHEMA
+        if rebuild:
+            statements += (
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",)
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_SCHEMA
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(connection):
+    if connection.vendor == 'sqlite':
+        statements = [f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}'
+                      for suffix in ('ai', 'ad', 'au')]
+        statements.append(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif connection.vendor == 'postgresql':
+        statements = [f'DROP INDEX IF EXISTS {PG_INDEX}']
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _sqlite_query(query):
+    # Каждое слово в кавычках: пользовательский ввод не станет синтаксисом
+    # FTS5, а слова объединяются через AND.
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+
+def matching_ids_sql(query, using='default'):
+    """Подзапрос с id постов, подходящих под запрос, для ``pk__in``."""
+    vendor = connections[using].vendor
+    if vendor == 'sqlite':
+        return (f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', [_sqlite_query(query)])
+    if vendor == 'postgresql':
+        return (f"SELECT id FROM posts_post WHERE to_tsvector("
+                f"'{PG_CONFIG}', text) @@ plainto_tsquery('{PG_CONFIG}', %s)",
+                [query])
+    return ('SELECT id FROM posts_post WHERE text LIKE %s',
+            [f'%{query}%'])
+
+
+def _ranked_sql(vendor):
+    """SQL ранжированной выдачи: строки (id, score).
+
+    Меньший ``score`` — более релевантный пост, порядок (score, id)
+    служит ключом для постраничного вывода.
+    """
+    if vendor == 'sqlite':
+        return (f"SELECT rowid AS id, bm25({FTS_TABLE}) AS score "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s")
+    if vendor == 'postgresql':
+        return (f"SELECT id, -ts_rank(to_tsvector('{PG_CONFIG}', text), "
+                f"plainto_tsquery('{PG_CONFIG}', %s)) AS score "
+                f"FROM posts_post WHERE to_tsvector('{PG_CONFIG}', text) "
+                f"@@ plainto_tsquery('{PG_CONFIG}', %s)")
+    return "SELECT id, 0.0 AS score FROM posts_post WHERE text LIKE %s"
+
+
+def _snippet_sql(vendor, param, ids):
+    """SQL сниппетов только для постов текущей страницы."""
+    placeholders = ', '.join(['%s'] * len(ids))
+    if vendor == 'sqlite':
+        return (f"SELECT rowid, snippet({FTS_TABLE}, 0, '{MARK_START}', "
+                f"'{MARK_END}', '…', {SNIPPET_WORDS}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+                [param, *ids])
+    if vendor == 'postgresql':
+        return (f"SELECT id, ts_headline('{PG_CONFIG}', text, "
+                f"plainto_tsquery('{PG_CONFIG}', %s), "
+                f"'StartSel={MARK_START}, StopSel={MARK_END}, "
+                f"MaxWords={SNIPPET_WORDS}') FROM posts_post "
+                f"WHERE id IN ({placeholders})", [param, *ids])
+    return (f"SELECT id, text FROM posts_post WHERE id IN ({placeholders})",
+            list(ids))
+
+
+def _search_param(vendor, query):
+    if vendor == 'sqlite':
+        return _sqlite_query(query)
+    if vendor == 'postgresql':
+        return query
+    return f'%{query}%'
+
+
+def highlight(snippet):
+    """Экранирует сниппет и выделяет совпадения тегом <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def encode_cursor(score, pk):
+    data = json.dumps([score, pk]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, pk = json.loads(data.decode())
+        return float(score), int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidSearchCursor(cursor)
+
+
+def search(query, cursor=None, limit=10, using='default'):
+    """Страница ранжированной выдачи.
+
+    Возвращает строки ``(id, score, сниппет)`` и курсор следующей
+    страницы или ``None``.
+    """
+    if not re.search(r'\w', query or ''):
+        return [], None
+    vendor = connections[using].vendor
+    param = _search_param(vendor, query)
+    sql = _ranked_sql(vendor)
+    params = [param] * sql.count('%s')
+    if cursor:
+        score, pk = decode_cursor(cursor)
+        sql = (f'SELECT id, score FROM ({sql}) ranked '
+               f'WHERE score > %s OR (score = %s AND id > %s)')
+        params += [score, score, pk]
+    sql += ' ORDER BY score, id LIMIT %s'
+    params.append(limit + 1)
+    with connections[using].cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+        snippets = {}
+        if rows:
+            db_cursor.execute(
+                *_snippet_sql(vendor, param, [pk for pk, _ in rows]))
+            snippets = dict(db_cursor.fetchall())
+    results = [(pk, score, snippets.get(pk, '')) for pk, score in rows]
+    return results, next_cursor
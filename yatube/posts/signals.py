@@ -0,0 +1,159 @@
+import threading
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import follow, homefeed
+from .cards import bump
+from .counters import (shift_author, shift_comments, shift_followers,
+                       shift_group)
+from .models import Comment, Follow, Group, Inbox, Post, User
+from .pagecache import SITE_FEED, bump_feeds
+from .search import install
+
+CARD_USER_FIELDS = {'first_name', 'last_name', 'username'}
+
+# Посты, которые сейчас удаляются вместе со своими комментариями.
+_local = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_local, 'posts'):
+        _local.posts = set()
+    return _local.posts
+
+
+def _count_post(previous, instance):
+    author_id, group_id = previous
+    if author_id != instance.author_id:
+        if author_id is not None:
+            shift_author(author_id, -1)
+        shift_author(instance.author_id, 1)
+    if group_id != instance.group_id:
+        shift_group(group_id, -1)
+        shift_group(instance.group_id, 1)
+
+
+def _reset_feeds(author_ids, group_ids):
+    usernames = User.objects.filter(pk__in=author_ids).values_list(
+        'username', flat=True)
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    bump_feeds(
+        'index',
+        *(f'author:{username}' for username in usernames),
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        previous = (None, None)
+    else:
+        previous = getattr(
+            instance, '_counted', (instance.author_id, instance.group_id))
+    _count_post(previous, instance)
+    _reset_feeds({previous[0], instance.author_id},
+                 {previous[1], instance.group_id})
+    bump('post', instance.pk)
+    homefeed.post_saved(instance, created)
+    if created:
+        follow.fan_out.delay(instance.pk)
+    instance.remember_counted()
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Каскад удаляет комментарии раньше поста: считать их незачем.
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+    shift_author(instance.author_id, -1)
+    shift_group(instance.group_id, -1)
+    _reset_feeds({instance.author_id}, {instance.group_id})
+    bump('post', instance.pk)
+    homefeed.post_deleted(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump('group', instance.pk)
+    bump_feeds(SITE_FEED)
+    homefeed.reset()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login: страницы не меняются.
+    if created or update_fields and not (
+            CARD_USER_FIELDS & set(update_fields)):
+        return
+    bump('user', instance.pk)
+    bump_feeds(SITE_FEED)
+    homefeed.reset()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_feeds(SITE_FEED)
+    homefeed.reset()
+
+
+def _reset_author(author_id):
+    # Профиль показывает число подписчиков и кнопку подписки.
+    username = User.objects.filter(pk=author_id).values_list(
+        'username', flat=True).first()
+    if username is not None:
+        bump_feeds(f'author:{username}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        shift_followers(instance.author_id, 1)
+        _reset_author(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    shift_followers(instance.author_id, -1)
+    Inbox.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id).delete()
+    _reset_author(instance.author_id)
+
+
+def _count_comment(post_id, delta):
+    if not shift_comments(post_id, delta):
+        return
+    # Карточки, ленты и окно главной показывают число комментариев.
+    post = Post.objects.select_related('author', 'group').get(pk=post_id)
+    bump('post', post.pk)
+    _reset_feeds({post.author_id}, {post.group_id})
+    homefeed.post_saved(post, False)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        _count_comment(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id not in _deleting_posts():
+        _count_comment(instance.post_id, -1)
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # Пересоздание таблицы в миграциях SQLite удаляет триггеры индекса.
+    connection = connections[using]
+    if Post._meta.db_table in connection.introspection.table_names():
+        install(connection)
@@ -0,0 +1,10 @@
+from django import template
+
+from posts.cards import CARD_TEMPLATE, render_card
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post, template_name=CARD_TEMPLATE):
+    return render_card(post, template_name)
@@ -0,0 +1,283 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from ..bench import (SCENARIOS, percentile, run_scenario, run_served,
+                     run_templates, seed)
+from ..exporter import export_queryset
+from ..importer import insert_posts
+from ..models import Group, ImportCheckpoint, Post, Profile
+
+User = get_user_model()
+
+
+class ExplainFeedsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(3)
+        )
+
+    @skipUnlessDBFeature('supports_explaining_query_execution')
+    def test_feeds_use_composite_indexes(self):
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        plans = out.getvalue()
+        if connection.vendor != 'sqlite':
+            self.skipTest('Имена индексов в плане зависят от базы')
+        for index in ('post_pub_date_id_idx',
+                      'post_group_pub_date_id_idx',
+                      'post_author_pub_date_id_idx',
+                      'inbox_user_pub_date_post_idx'):
+            with self.subTest(index=index):
+                self.assertIn(index, plans)
+
+
+class BenchTest(TestCase):
+    def test_scenarios_report_latency_and_queries(self):
+        dataset = seed(users=3, groups=2, posts=15)
+        self.assertEqual(Post.objects.count(), 15)
+        for name in SCENARIOS:
+            with self.subTest(scenario=name):
+                result = run_scenario(name, dataset, requests=3)
+                self.assertEqual(result['requests'], 3)
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_revalidate_saves_bytes(self):
+        dataset = seed(users=1, groups=1, posts=1)
+        plain = run_scenario('post_detail', dataset, requests=4)
+        result = run_scenario('post_detail', dataset, requests=4,
+                              revalidate=True)
+        self.assertEqual(plain['not_modified'], 0)
+        self.assertEqual(result['not_modified'], 3)
+        self.assertLess(result['bytes_per_request'],
+                        plain['bytes_per_request'] / 2)
+
+    def test_view_exception_counts_as_error(self):
+        dataset = seed(users=1, groups=1, posts=1)
+        with mock.patch('posts.views.render_conditional',
+                        side_effect=RuntimeError('сбой')), \
+                self.assertLogs('posts.bench', 'ERROR'):
+            result = run_scenario('post_detail', dataset, requests=2)
+        self.assertEqual(result['requests'], 2)
+        self.assertEqual(result['errors'], 2)
+
+    def test_template_timings(self):
+        dataset = seed(users=2, groups=1, posts=5)
+        result = run_templates(dataset, repeat=1)
+        self.assertIn('render_ms', result['posts/index.html'])
+        self.assertIn('uncached_ms', result['users/login.html'])
+        self.assertNotIn('render_ms', result['includes/header.html'])
+        self.assertGreater(result['base.html']['parse_ms'], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+
+class ServedBenchTest(TransactionTestCase):
+    # Сервер обрабатывает запросы в своих потоках: данные должны быть
+    # закоммичены, а не спрятаны в транзакции теста. Клиент один:
+    # общая база SQLite в памяти не ждёт снятия блокировок.
+    def test_wsgi_and_asgi_serve_scenarios(self):
+        dataset = seed(users=3, groups=2, posts=15)
+        for server in ('wsgi', 'asgi'):
+            for name in ('index', 'post_detail', 'post_create'):
+                with self.subTest(server=server, scenario=name):
+                    result = run_served(
+                        name, dataset, requests=4, server=server,
+                        concurrency=1, workers=2, client_delay=0)
+                    self.assertEqual(result['requests'], 4)
+                    self.assertEqual(result['errors'], 0)
+
+
+class ImportPostsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.workdir.name, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def test_import_jsonl(self):
+        rows = [
+            {'text': 'Первый', 'author': 'auth', 'group': 'test-slug',
+             'pub_date': '2020-01-02T03:04:05+00:00'},
+            {'text': 'Второй', 'author': 'auth'},
+            {'text': 'Чужой', 'author': 'nobody'},
+        ]
+        path = self.write('posts.jsonl', '\n'.join(map(json.dumps, rows)))
+        call_command('import_posts', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(text='Первый')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(Profile.objects.get(user=self.user).post_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_import_leaves_pub_date_field_alone(self):
+        # Пост, сохранённый другим запросом во время импорта, получает
+        # дату публикации как обычно.
+        created = []
+
+        def insert_with_neighbour(posts):
+            created.append(Post.objects.create(text='Соседний',
+                                               author=self.user))
+            insert_posts(posts)
+
+        path = self.write('posts.jsonl', json.dumps(
+            {'text': 'Старый', 'author': 'auth',
+             'pub_date': '2020-01-02T03:04:05+00:00'}))
+        with mock.patch('posts.importer.insert_posts', insert_with_neighbour):
+            call_command('import_posts', path, stdout=StringIO())
+        neighbour = Post.objects.get(pk=created[0].pk)
+        self.assertEqual(neighbour.pub_date.year, timezone.now().year)
+        self.assertEqual(Post.objects.get(text='Старый').pub_date.year, 2020)
+
+    def test_insert_posts_keeps_dates(self):
+        # Закрепляет поведение закрытого QuerySet._insert(raw=True).
+        old = timezone.make_aware(timezone.datetime(2020, 1, 2, 3, 4, 5))
+        insert_posts([Post(text='Старый', author=self.user,
+                           pub_date=old, updated_at=old)])
+        post = Post.objects.get(text='Старый')
+        self.assertEqual((post.pub_date, post.updated_at), (old, old))
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_import_csv(self):
+        path = self.write(
+            'posts.csv',
+            'text,author,group\nИз CSV,auth,test-slug\nБез группы,auth,\n')
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(self.group.posts.count(), 1)
+        self.assertEqual(self.user.posts.count(), 2)
+
+    def test_resume_after_failure(self):
+        path = self.write('posts.jsonl', '\n'.join((
+            json.dumps({'text': 'Первый', 'author': 'auth'}),
+            'не json',
+            json.dumps({'text': 'Третий', 'author': 'auth'}),
+        )))
+        with self.assertRaises(CommandError):
+            call_command('import_posts', path, batch_size=1,
+                         stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(
+            ImportCheckpoint.objects.get(name=f'{path}.checkpoint').rows, 1)
+        self.write('posts.jsonl', '\n'.join((
+            json.dumps({'text': 'Первый', 'author': 'auth'}),
+            json.dumps({'text': 'Второй', 'author': 'auth'}),
+            json.dumps({'text': 'Третий', 'author': 'auth'}),
+        )))
+        call_command('import_posts', path, resume=True, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Первый', 'Второй', 'Третий'],
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_checkpoint_rolls_back_with_batch(self):
+        path = self.write('posts.jsonl', '\n'.join((
+            json.dumps({'text': 'Первый', 'author': 'auth'}),
+            json.dumps({'text': 'Второй', 'author': 'auth'}),
+        )))
+        with mock.patch('posts.importer.follow.refill',
+                        side_effect=[None, DatabaseError('сбой')]):
+            with self.assertRaises(CommandError):
+                call_command('import_posts', path, batch_size=1,
+                             stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(
+            ImportCheckpoint.objects.get(name=f'{path}.checkpoint').rows, 1)
+        call_command('import_posts', path, resume=True, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Первый', 'Второй'],
+        )
+
+
+class ExportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=cls.user, group=cls.group, text='Первый')
+        Post.objects.create(author=cls.staff, text='Второй')
+
+    def test_export_command_jsonl(self):
+        out = StringIO()
+        call_command('export_posts', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['text'] for row in rows], ['Первый', 'Второй'])
+        self.assertEqual(rows[0]['author'], 'auth')
+        self.assertEqual(rows[0]['group'], 'test-slug')
+        self.assertIsNone(rows[1]['group'])
+
+    def test_export_command_filters_csv(self):
+        out = StringIO()
+        call_command('export_posts', format='csv', group='test-slug',
+                     since='2000-01-01', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([row['text'] for row in rows], ['Первый'])
+
+    def test_export_until_is_inclusive(self):
+        first = Post.objects.get(text='Первый')
+        moment = first.pub_date.isoformat()
+        for until in (moment, timezone.localdate(first.pub_date).isoformat()):
+            with self.subTest(until=until):
+                texts = [text for _, text, *_ in export_queryset(
+                    until=until, author='auth')]
+                self.assertEqual(texts, ['Первый'])
+        before = (first.pub_date - timezone.timedelta(
+            microseconds=1)).isoformat()
+        self.assertFalse(export_queryset(until=before).exists())
+
+    def test_export_view_streams_for_staff_only(self):
+        url = reverse('posts:post_export')
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(self.staff)
+        response = self.client.get(url, {'author': 'staff'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['text'], 'Второй')
+        self.assertEqual(len(lines), 1)
+        response = self.client.get(url, {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import CONSTANT_SYMBOLS, Group, Post
+from ..counters import recount
+from ..models import CONSTANT_SYMBOLS, Comment, Group, Post, Profile
 
 User = get_user_model()
 
@@ -33,3 +34,109 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text[:CONSTANT_SYMBOLS]
         self.assertEqual(expected_object_name, str(post))
+
+
+class PostCountersTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, author, group, other_group):
+        self.user.profile.refresh_from_db()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.user.profile.post_count, author)
+        self.assertEqual(self.group.post_count, group)
+        self.assertEqual(self.other_group.post_count, other_group)
+
+    def test_counters_follow_create_edit_and_delete(self):
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Первый')
+        Post.objects.create(author=self.user, text='Второй')
+        self.assertCounters(2, 1, 0)
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(2, 0, 1)
+        post.text = 'Без смены группы'
+        post.save()
+        self.assertCounters(2, 0, 1)
+        post.delete()
+        self.assertCounters(1, 0, 0)
+
+    def test_recount_repairs_drift(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f'Пост {i}')
+            for i in range(3)
+        )
+        self.assertFalse(Profile.objects.filter(user=self.user).exists())
+        self.assertEqual(recount(), 2)
+        self.assertCounters(3, 3, 0)
+        self.assertEqual(recount(), 0)
+
+
+class CommentCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+
+    def comment(self):
+        return Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+
+    def test_count_follows_create_and_delete(self):
+        first = self.comment()
+        self.comment()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        first.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_deleting_post_skips_comment_counts(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Ответ {i}')
+            for i in range(20)
+        )
+        # Запросы не растут с числом комментариев.
+        with self.assertNumQueries(7):
+            self.post.delete()
+        self.assertFalse(Comment.objects.exists())
+
+    def test_deleting_user_counts_comments_on_other_posts(self):
+        reader = User.objects.create_user(username='reader')
+        own = Post.objects.create(author=reader, text='Свой пост')
+        Comment.objects.create(post=own, author=self.user, text='Ответ')
+        Comment.objects.create(post=self.post, author=reader, text='Ответ')
+        reader.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_saving_stale_post_keeps_count(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        self.comment()
+        stale.text = 'Отредактированный пост'
+        stale.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'Отредактированный пост')
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_recount_repairs_comment_count(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Ответ {i}')
+            for i in range(3)
+        )
+        self.assertEqual(recount(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(recount(), 0)
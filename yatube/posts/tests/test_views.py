@@ -1,17 +1,46 @@
+import shutil
+import tempfile
+import time
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
+
+from core import tasks
 
-from ..models import Group, Post
-from ..views import POSTS_QUANTITY
+from .. import follow, homefeed, thumbnails
+from ..cards import card_stats
+from ..importer import PostImporter
+from ..models import Comment, Follow, Group, Inbox, Post, Profile
+from ..pagecache import feed_version
+from ..paginators import KeysetPaginator
+from ..views import COMMENTS_QUANTITY, POSTS_QUANTITY
+from .utils import QueryBudgetMixin, query_budget
 
 POSTS_OVERALL = 13
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 User = get_user_model()
 
 
 class PostPagesTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='StasBasov')
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -92,6 +121,7 @@ class PostPagesTests(TestCase):
         form_fields = {
             'text': forms.fields.CharField,
             'group': forms.fields.ChoiceField,
+            'image': forms.fields.ImageField,
         }
         for value, expected in form_fields.items():
             with self.subTest(value=value):
@@ -105,6 +135,7 @@ class PostPagesTests(TestCase):
         form_fields = {
             'text': forms.fields.CharField,
             'group': forms.fields.ChoiceField,
+            'image': forms.fields.ImageField,
         }
         for value, expected in form_fields.items():
             with self.subTest(value=value):
@@ -130,6 +161,7 @@ class PostPagesTests(TestCase):
 
 class TestPaginator(TestCase):
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user('test')
         self.authorized_client = Client()
@@ -184,3 +216,775 @@ class TestPaginator(TestCase):
                 count_posts_second,
                 POSTS_OVERALL - POSTS_QUANTITY
             )
+
+    def test_paginator_cursor_pages(self):
+        response_first = self.guest_client.get(reverse('posts:index'))
+        page_first = response_first.context['page_obj']
+        response_second = self.guest_client.get(
+            reverse('posts:index'), {'cursor': page_first.next_cursor})
+        page_second = response_second.context['page_obj']
+        self.assertEqual(page_second.number, 2)
+        self.assertEqual(len(page_second), POSTS_OVERALL - POSTS_QUANTITY)
+        self.assertFalse(page_second.has_next())
+        self.assertFalse(set(page_first) & set(page_second))
+        response_back = self.guest_client.get(
+            reverse('posts:index'), {'cursor': page_second.previous_cursor})
+        page_back = response_back.context['page_obj']
+        self.assertEqual(page_back.number, 1)
+        self.assertEqual(list(page_back), list(page_first))
+
+    def test_paginator_invalid_cursor_shows_first_page(self):
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), POSTS_QUANTITY)
+
+    def test_paginator_count_is_capped(self):
+        paginator = KeysetPaginator(
+            Post.objects.all(), POSTS_QUANTITY, count_limit=POSTS_QUANTITY)
+        self.assertEqual(paginator.count, POSTS_QUANTITY)
+        self.assertFalse(paginator.count_is_exact)
+        page = paginator.get_page(1)
+        self.assertTrue(page.has_next())
+        self.assertEqual(
+            len(paginator.get_page(None, page.next_cursor)),
+            POSTS_OVERALL - POSTS_QUANTITY
+        )
+
+
+class PostCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            text='Тестовый текст',
+            group=self.group,
+            author=self.user
+        )
+
+    def get_index(self):
+        return self.client.get(reverse('posts:index')).content.decode()
+
+    def test_card_is_cached(self):
+        before = card_stats()
+        self.get_index()
+        self.client.get(reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}))
+        after = card_stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_card_invalidated_on_changes(self):
+        self.get_index()
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertIn('Новый текст', self.get_index())
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertIn('/group/new-slug/', self.get_index())
+        self.user.first_name = 'Стас'
+        self.user.save()
+        self.assertIn('Стас', self.get_index())
+
+
+class FeedPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            text='Тестовый текст',
+            group=self.group,
+            author=self.user
+        )
+        self.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+
+    def test_anonymous_pages_are_cached(self):
+        for page in self.pages:
+            with self.subTest(page=page):
+                first = self.client.get(page)
+                with self.assertNumQueries(0):
+                    second = self.client.get(page)
+                self.assertEqual(first.content, second.content)
+
+    def test_new_post_resets_feed_pages(self):
+        for page in self.pages:
+            self.client.get(page)
+        Post.objects.create(
+            text='Свежий пост', group=self.group, author=self.user)
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.client.get(page)
+                self.assertIn('Свежий пост', response.content.decode())
+
+    def test_authorized_pages_are_not_cached(self):
+        self.authorized_client.get(self.pages[0])
+        response = self.authorized_client.get(self.pages[0])
+        self.assertIn('page_obj', response.context)
+
+
+class HomeFeedWindowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(POSTS_OVERALL):
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                group=self.group)
+
+    def get_index(self, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'), data or {})
+        tables = [query['sql'] for query in queries
+                  if 'posts_post' in query['sql']]
+        return response.context['page_obj'], tables
+
+    def test_window_pages_do_not_query_posts(self):
+        self.get_index()
+        for data in ({}, {'page': 2}):
+            with self.subTest(data=data):
+                page, queries = self.get_index(data)
+                self.assertEqual(queries, [])
+                self.assertEqual(
+                    [post.pk for post in page],
+                    list(Post.objects.values_list('pk', flat=True)[
+                        (page.number - 1) * POSTS_QUANTITY:
+                        page.number * POSTS_QUANTITY]))
+        self.assertEqual(page.paginator.count, POSTS_OVERALL)
+
+    def test_window_follows_post_changes(self):
+        self.get_index()
+        first = Post.objects.first()
+        first.delete()
+        created = Post.objects.create(text='Новый пост', author=self.user)
+        page, queries = self.get_index({'page': 2})
+        self.assertEqual(queries, [])
+        self.assertEqual(page[len(page) - 1].text, created.text)
+        self.assertIsNone(page[len(page) - 1].group)
+        page, _ = self.get_index()
+        self.assertNotIn(first.pk, [post.pk for post in page])
+
+    def test_window_cursor_pages(self):
+        self.get_index()
+        first, _ = self.get_index()
+        second, queries = self.get_index({'cursor': first.next_cursor})
+        self.assertEqual(queries, [])
+        self.assertEqual(len(second), POSTS_OVERALL - POSTS_QUANTITY)
+        self.assertFalse(second.has_next())
+        back, _ = self.get_index({'cursor': second.previous_cursor})
+        self.assertEqual(back.number, 1)
+        self.assertEqual([post.pk for post in back],
+                         [post.pk for post in first])
+
+    @override_settings(HOME_FEED_WINDOW=POSTS_QUANTITY + 1)
+    def test_pages_past_window_use_database(self):
+        self.get_index()
+        page, queries = self.get_index({'page': 2})
+        self.assertNotEqual(queries, [])
+        self.assertEqual(len(page), POSTS_OVERALL - POSTS_QUANTITY)
+        self.assertFalse(page.has_next())
+
+    @override_settings(HOME_FEED_WINDOW=POSTS_QUANTITY + 1)
+    def test_previous_page_past_window_uses_database(self):
+        for i in range(POSTS_QUANTITY * 2):
+            Post.objects.create(text=f'Ещё пост {i}', author=self.user)
+        self.get_index()
+        pages = [self.get_index()[0]]
+        for _ in range(2):
+            pages.append(self.get_index(
+                {'cursor': pages[-1].next_cursor})[0])
+        back, queries = self.get_index(
+            {'cursor': pages[-1].previous_cursor})
+        self.assertNotEqual(queries, [])
+        self.assertEqual(back.number, 2)
+        self.assertEqual([post.pk for post in back],
+                         [post.pk for post in pages[1]])
+
+
+@override_settings(CACHE_ON_COMMIT=True)
+class CacheOnCommitTests(TransactionTestCase):
+    # Колбэки on_commit вызываются только при настоящем коммите.
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        Post.objects.create(text='Первый пост', author=self.user)
+        homefeed.get_window()
+        self.version = feed_version('index')
+
+    def window(self):
+        return [row['text'] for row in homefeed.get_window()['rows']]
+
+    def test_rollback_leaves_caches(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(text='Откаченный пост', author=self.user)
+            raise RuntimeError
+        self.assertEqual(self.window(), ['Первый пост'])
+        self.assertEqual(feed_version('index'), self.version)
+
+    def test_caches_change_after_commit(self):
+        with transaction.atomic():
+            Post.objects.create(text='Новый пост', author=self.user)
+            self.assertEqual(self.window(), ['Первый пост'])
+            self.assertEqual(feed_version('index'), self.version)
+        self.assertEqual(self.window(), ['Первый пост', 'Новый пост'])
+        self.assertNotEqual(feed_version('index'), self.version)
+
+
+class PostQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            text='Тестовый текст',
+            group=self.group,
+            author=self.user
+        )
+
+    def add_posts(self):
+        start = Group.objects.count()
+        for i in range(start, start + POSTS_OVERALL):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-')
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                group=self.group)
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                group=group)
+
+    def test_feed_views_are_query_bounded(self):
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 5,
+            reverse('posts:profile', kwargs={'username': self.user}): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueriesBounded(
+                    self.authorized_client, url, budget, self.add_posts)
+
+    def add_comments(self):
+        for i in range(COMMENTS_QUANTITY):
+            author = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(post=self.post, author=author,
+                                   text=f'Комментарий {i}')
+
+    def test_post_detail_is_query_bounded(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        Comment.objects.create(post=self.post, author=self.user, text='-')
+        # Сессия, пользователь, пост и страница комментариев с авторами.
+        self.assertQueriesBounded(
+            self.authorized_client, url, 4, self.add_comments)
+
+    @query_budget(3)
+    def test_post_detail_query_budget(self):
+        self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}))
+
+    @query_budget(4)
+    def test_post_edit_query_budget(self):
+        self.authorized_client.get(reverse(
+            'posts:post_edit', kwargs={'post_id': self.post.pk}))
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='StasBasov')
+        self.post = Post.objects.create(
+            text='Штирлиц шёл по <b>лесу</b>', author=self.user)
+        Post.objects.bulk_create(
+            Post(text=f'Лес номер {i}', author=self.user)
+            for i in range(POSTS_OVERALL)
+        )
+        Post.objects.create(text='Про море', author=self.user)
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return response, [post for post, _ in response.context['results']]
+
+    def test_search_finds_and_highlights(self):
+        response, posts = self.search(q='штирлиц')
+        self.assertEqual(posts, [self.post])
+        content = response.content.decode()
+        self.assertIn('<mark>Штирлиц</mark>', content)
+        self.assertIn('&lt;b&gt;', content)
+
+    def test_search_follows_edits_and_deletes(self):
+        self.post.text = 'Теперь про горы'
+        self.post.save()
+        self.assertEqual(self.search(q='штирлиц')[1], [])
+        self.assertEqual(self.search(q='горы')[1], [self.post])
+        self.post.delete()
+        self.assertEqual(self.search(q='горы')[1], [])
+
+    def test_search_pages_with_cursor(self):
+        response, first = self.search(q='лес номер')
+        self.assertEqual(len(first), POSTS_QUANTITY)
+        _, second = self.search(
+            q='лес номер', cursor=response.context['next_cursor'])
+        self.assertEqual(len(second), POSTS_OVERALL - POSTS_QUANTITY)
+        self.assertFalse(set(first) & set(second))
+
+    def test_search_ignores_query_syntax(self):
+        for query in ('"', 'AND OR NOT', '*', ''):
+            with self.subTest(query=query):
+                response, _ = self.search(q=query)
+                self.assertEqual(response.status_code, 200)
+
+
+class FeedApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='StasBasov', first_name='Стас', last_name='Басов')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(POSTS_OVERALL):
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                group=self.group)
+
+    def test_feeds_paginate_by_cursor(self):
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:api_profile', kwargs={'username': 'StasBasov'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(len(first['results']), POSTS_QUANTITY)
+                second = self.client.get(first['next']).json()
+                self.assertEqual(len(second['results']),
+                                 POSTS_OVERALL - POSTS_QUANTITY)
+                self.assertIsNone(second['next'])
+                ids = [item['id'] for item in
+                       first['results'] + second['results']]
+                self.assertEqual(
+                    ids, list(Post.objects.values_list('pk', flat=True)))
+
+    def test_item_fields(self):
+        item = self.client.get(reverse('posts:api_index')).json()[
+            'results'][0]
+        post = Post.objects.first()
+        self.assertEqual(item, {
+            'id': post.pk,
+            'url': reverse('posts:post_detail', args=(post.pk,)),
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'image': None,
+            'comment_count': 0,
+            'author': {'username': 'StasBasov', 'full_name': 'Стас Басов'},
+            'group': {'slug': 'test-slug', 'title': 'Тестовая группа'},
+        })
+
+    def test_single_query_per_page(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('posts:api_index'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse(
+                'posts:api_group_list', kwargs={'slug': 'test-slug'}))
+
+    def test_etag_not_modified(self):
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_gzip(self):
+        url = reverse('posts:api_index')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_feed(self):
+        response = self.client.get(reverse(
+            'posts:api_group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            text='Тестовый текст',
+            group=self.group,
+            author=self.user
+        )
+        self.pages = (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+
+    def test_not_modified_without_rendering(self):
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertIn('no-cache', response['Cache-Control'])
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertFalse(response.templates)
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_if_modified_since_is_ignored(self):
+        # Переименование группы не трогает updated_at постов, но меняет
+        # страницу: проверять её можно только по ETag.
+        since = http_date(time.time() + 60)
+        for page in self.pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertFalse(response.has_header('Last-Modified'))
+                response = self.authorized_client.get(
+                    page, HTTP_IF_MODIFIED_SINCE=since)
+                self.assertEqual(response.status_code, 200)
+
+    def test_edit_changes_etag(self):
+        etags = {page: self.authorized_client.get(page)['ETag']
+                 for page in self.pages}
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Новый текст', response.content.decode())
+
+    def test_etag_depends_on_user(self):
+        for page in self.pages:
+            with self.subTest(page=page):
+                etag = self.client.get(page)['ETag']
+                response = self.authorized_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_login_changes_etag(self):
+        # Страницы с формами: после входа CSRF-токен в них другой.
+        reader = User.objects.create_user('reader', password='s3cret-pass')
+        credentials = {'username': 'reader', 'password': 's3cret-pass'}
+        client = Client()
+        client.post(reverse('users:login'), credentials)
+        etags = {page: client.get(page)['ETag'] for page in self.pages}
+        client.get(reverse('users:logout'))
+        client.post(reverse('users:login'), credentials)
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = client.get(page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['user'], reader)
+
+    def test_cached_page_not_modified(self):
+        page = self.pages[1]
+        etag = self.client.get(page)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class FollowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='follower')
+        self.author = User.objects.create_user(username='author')
+        self.stranger = User.objects.create_user(username='stranger')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.old_post = Post.objects.create(
+            text='Пост до подписки', author=self.author)
+        Post.objects.create(text='Чужой пост', author=self.stranger)
+
+    def follow(self, author=None, client=None):
+        author = author or self.author
+        return (client or self.authorized_client).post(reverse(
+            'posts:profile_follow', kwargs={'username': author.username}))
+
+    def feed(self, **params):
+        response = self.authorized_client.get(
+            reverse('posts:follow_index'), params)
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_and_unfollow(self):
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertRedirects(self.follow(), profile)
+        self.follow()
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author).count(),
+            1)
+        response = self.authorized_client.get(profile)
+        self.assertTrue(response.context['following'])
+        self.assertEqual(self.author.profile.follower_count, 1)
+        self.authorized_client.post(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(Inbox.objects.exists())
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.follower_count, 0)
+
+    def test_follow_requires_post_and_other_author(self):
+        url = reverse('posts:profile_follow', kwargs={'username': 'author'})
+        self.assertEqual(self.authorized_client.get(url).status_code, 405)
+        self.follow(self.user)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_feed_shows_followed_authors(self):
+        self.assertEqual(self.feed(), [])
+        self.follow()
+        Post.objects.create(text='Пост после подписки', author=self.author)
+        self.assertEqual(self.feed(),
+                         ['Пост до подписки', 'Пост после подписки'])
+        self.assertEqual(Inbox.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(FOLLOW_FANOUT_LIMIT=2)
+    def test_celebrity_posts_are_pulled(self):
+        self.follow()
+        other = Client()
+        other.force_login(self.stranger)
+        self.follow(client=other)
+        self.author.profile.refresh_from_db()
+        self.assertTrue(self.author.profile.celebrity)
+        Post.objects.create(text='Пост знаменитости', author=self.author)
+        self.assertEqual(Inbox.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.feed(),
+                         ['Пост до подписки', 'Пост знаменитости'])
+
+    def test_many_celebrities(self):
+        # Больше частей UNION ALL, чем SQLite принимает в одном запросе.
+        User.objects.bulk_create(
+            User(username=f'star{i}') for i in range(600))
+        stars = list(User.objects.filter(username__startswith='star'))
+        Profile.objects.bulk_create(
+            Profile(user=star, celebrity=True) for star in stars)
+        Follow.objects.bulk_create(
+            Follow(user=self.user, author=star) for star in stars)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {star.username}', author=star)
+            for star in stars[-POSTS_OVERALL:])
+        feed = self.feed()
+        self.assertEqual(len(feed), POSTS_QUANTITY)
+        self.assertEqual(feed[0], f'Пост star{600 - POSTS_OVERALL}')
+        # По одному запросу UNION ALL на пачку авторов.
+        posts = Post.objects.filter(author__in=stars).order_by(
+            'pub_date', 'pk')
+        with self.assertNumQueries(3):
+            keys = follow._celebrity_keys([star.pk for star in stars],
+                                          None, 2)
+        self.assertEqual(keys, list(posts.values_list('pub_date', 'pk')[:2]))
+
+    def test_feed_pages_by_cursor(self):
+        self.follow()
+        for i in range(POSTS_OVERALL):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        # Сессия, пользователь, входящие, знаменитости и сами посты.
+        with self.assertNumQueries(5):
+            response = self.authorized_client.get(
+                reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), POSTS_QUANTITY)
+        rest = self.feed(cursor=page.next_cursor)
+        self.assertEqual(len(rest), POSTS_OVERALL + 1 - POSTS_QUANTITY)
+        self.assertEqual(rest[-1], f'Пост {POSTS_OVERALL - 1}')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_fan_out_runs_in_worker(self):
+        self.follow()
+        Post.objects.create(text='Пост после подписки', author=self.author)
+        self.assertEqual(self.feed(), ['Пост до подписки'])
+        self.assertEqual(tasks.work(until_empty=True), (1, 0))
+        self.assertEqual(self.feed(),
+                         ['Пост до подписки', 'Пост после подписки'])
+
+    def test_imported_posts_reach_inbox(self):
+        self.follow()
+        PostImporter().import_batch([{'text': 'Импорт', 'author': 'author'}])
+        self.assertIn('Импорт', self.feed())
+
+
+class CommentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='commenter')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        self.detail = reverse('posts:post_detail',
+                              kwargs={'post_id': self.post.pk})
+
+    def comment(self, client, text='Комментарий'):
+        return client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': text})
+
+    def test_authorized_user_comments(self):
+        self.assertRedirects(
+            self.comment(self.authorized_client), self.detail)
+        response = self.authorized_client.get(self.detail)
+        self.assertEqual([comment.text for comment in
+                          response.context['comments']], ['Комментарий'])
+        self.assertIsInstance(
+            response.context['form'].fields['text'], forms.CharField)
+
+    def test_guest_cannot_comment(self):
+        response = self.comment(self.client)
+        self.assertRedirects(
+            response, f"{reverse('users:login')}?next="
+            f"{reverse('posts:add_comment', args=(self.post.pk,))}")
+        self.assertFalse(Comment.objects.exists())
+
+    def test_feeds_show_fresh_comment_count(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'commenter'}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        self.comment(self.authorized_client)
+        self.comment(self.authorized_client)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Комментариев: 2')
+
+    def test_comments_page_by_cursor(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Ответ {i}')
+            for i in range(COMMENTS_QUANTITY + 3)
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            comment_count=COMMENTS_QUANTITY + 3)
+        page = self.client.get(self.detail).context['comments']
+        self.assertEqual(len(page), COMMENTS_QUANTITY)
+        self.assertEqual(page.paginator.num_pages, 2)
+        rest = self.client.get(
+            self.detail, {'cursor': page.next_cursor}).context['comments']
+        self.assertEqual([comment.text for comment in rest],
+                         [f'Ответ {i}' for i in range(
+                             COMMENTS_QUANTITY, COMMENTS_QUANTITY + 3)])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class PostImageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.client.force_login(self.user)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def test_create_post_with_image(self):
+        response = self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'group': self.group.pk,
+            'image': SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.startswith('posts/small'))
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'src="/media/cache/')
+
+    def test_media_served_with_long_cache(self):
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        response = self.client.get(post.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.MEDIA_CACHE_SECONDS}',
+                      response['Cache-Control'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class QueuedThumbnailTests(TransactionTestCase):
+    # Миниатюры создаются в потоке пула: он должен видеть данные теста.
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='StasBasov')
+        self.post = Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile('queued.gif', SMALL_GIF, 'image/gif'))
+
+    def test_thumbnail_generated_off_request(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{self.post.image.url}"')
+        thumbnails.join(timeout=10)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'src="/media/cache/')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_thumbnail_generated_by_worker(self):
+        for _ in range(2):
+            response = self.client.get(reverse('posts:index'))
+            self.assertContains(response, f'src="{self.post.image.url}"')
+        self.assertEqual(tasks.work(until_empty=True), (1, 0))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'src="/media/cache/')
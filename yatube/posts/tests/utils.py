@@ -0,0 +1,59 @@
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class _AssertMaxQueriesContext(CaptureQueriesContext):
+    def __init__(self, test_case, budget, connection):
+        self.test_case = test_case
+        self.budget = budget
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        executed = len(self)
+        self.test_case.assertLessEqual(
+            executed, self.budget,
+            '%d queries executed, budget is %d\nCaptured queries were:\n%s' % (
+                executed, self.budget,
+                '\n'.join(
+                    '%d. %s' % (i, query['sql'])
+                    for i, query in enumerate(self.captured_queries, start=1)
+                ),
+            ),
+        )
+
+
+class QueryBudgetMixin:
+    """Проверки, что view укладывается в заданное число запросов."""
+
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        return _AssertMaxQueriesContext(self, budget, connections[using])
+
+    def assertQueriesBounded(self, client, url, budget, grow):
+        """Число запросов не зависит от количества записей на странице.
+
+        ``grow`` добавляет данные между двумя замерами.
+        """
+        with self.assertMaxQueries(budget) as before:
+            client.get(url)
+        grow()
+        with self.assertMaxQueries(budget) as after:
+            client.get(url)
+        self.assertEqual(
+            len(before), len(after),
+            f'{url}: число запросов растёт вместе с данными')
+
+
+def query_budget(budget, using=DEFAULT_DB_ALIAS):
+    """Декоратор теста: весь тест должен уложиться в ``budget`` запросов."""
+    def decorator(test_method):
+        @wraps(test_method)
+        def wrapper(self, *args, **kwargs):
+            with _AssertMaxQueriesContext(self, budget, connections[using]):
+                return test_method(self, *args, **kwargs)
+        return wrapper
+    return decorator
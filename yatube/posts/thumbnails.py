@@ -0,0 +1,127 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import tasks
+
+from .cards import bump
+from .models import Post
+from .pagecache import bump_feeds
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 2
+# Миниатюра карточки в лентах; шаблоны используют те же параметры.
+CARD_GEOMETRY = '960x339'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                getattr(settings, 'THUMBNAIL_WORKERS', WORKERS),
+                thread_name_prefix='thumbnail',
+            )
+        return _executor
+
+
+def join(timeout=None):
+    """Ждёт миниатюры, поставленные в очередь к этому моменту."""
+    with _lock:
+        futures = list(_pending.values())
+    wait(futures, timeout)
+
+
+def _reset_cards(name):
+    # Карточки и страницы лент, отрисованные с исходной картинкой,
+    # перерисуются уже с миниатюрой.
+    posts = Post.objects.filter(image=name).select_related('author', 'group')
+    feeds = {'index'}
+    for post in posts:
+        bump('post', post.pk)
+        feeds.add(f'author:{post.author.username}')
+        if post.group is not None:
+            feeds.add(f'group:{post.group.slug}')
+    bump_feeds(*feeds)
+
+
+@tasks.task
+def generate(source_name, geometry_string, options):
+    """Задача очереди: миниатюра для воркера ``run_worker``."""
+    ThumbnailBackend().get_thumbnail(source_name, geometry_string,
+                                     **options)
+    _reset_cards(source_name)
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    """Создаёт миниатюры в фоне, а не в запросе.
+
+    Готовая миниатюра берётся из хранилища ключей sorl-thumbnail.
+    При промахе генерация ставится в очередь ``THUMBNAIL_WORKERS``
+    потоков, а шаблон получает исходную картинку. С
+    ``THUMBNAIL_WORKERS = 0`` миниатюры создаются сразу, как в sorl.
+    Без ``TASKS_EAGER`` генерация уходит в очередь задач воркера.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_ or not getattr(settings, 'THUMBNAIL_WORKERS', WORKERS):
+            return super().get_thumbnail(file_, geometry_string, **options)
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._full_options(source, options))
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        self._schedule(source.name, name, geometry_string, options)
+        return source
+
+    def _full_options(self, source, options):
+        # Те же умолчания, что подставляет ThumbnailBackend.get_thumbnail:
+        # от них зависит имя файла миниатюры.
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def _schedule(self, source_name, name, geometry_string, options):
+        if not tasks.eager():
+            tasks.enqueue(generate, (source_name, geometry_string, options),
+                          key=f'thumbnail:{name}')
+            return
+        executor = _get_executor()
+        with _lock:
+            if name not in _pending:
+                _pending[name] = executor.submit(
+                    self._generate, source_name, name, geometry_string,
+                    options)
+
+    def _generate(self, source_name, name, geometry_string, options):
+        try:
+            super().get_thumbnail(source_name, geometry_string, **options)
+            _reset_cards(source_name)
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', name)
+        finally:
+            with _lock:
+                _pending.pop(name, None)
+            connections.close_all()
@@ -1,66 +1,157 @@
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
-from .forms import PostForm
-from .models import Group, Post, User
+from .exporter import CONTENT_TYPES, export_lines, parse_moment
+from . import follow, homefeed
+from .conditional import render_conditional
+from .forms import CommentForm, PostForm
+from .models import Follow, Group, Post, User
+from .pagecache import cache_feed
+from .search import InvalidSearchCursor, highlight, search
+from .paginators import KeysetPaginator
 
 POSTS_QUANTITY = 10
+COMMENTS_QUANTITY = 10
+COMMENT_ORDERING = ('created', 'pk')
 
 
 def paginatorr(post_list, request):
-    paginator = Paginator(post_list, POSTS_QUANTITY)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    paginator = KeysetPaginator(post_list, POSTS_QUANTITY)
+    return paginator.get_page(
+        request.GET.get('page'), request.GET.get('cursor'))
 
 
+@cache_feed('index')
 def index(request):
+    posts = Post.objects.select_related('group', 'author')
+    page_obj = homefeed.page(posts, POSTS_QUANTITY, request.GET.get('page'),
+                             request.GET.get('cursor'))
     context = {
-        'page_obj': paginatorr(
-            Post.objects.select_related('group', 'author'), request)
+        'page_obj': page_obj or paginatorr(posts, request)
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_feed('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
+    page_obj = paginatorr(posts, request)
     context = {
         'groups': group,
-        'page_obj': paginatorr(posts, request)
+        'page_obj': page_obj
     }
-    return render(request, 'posts/group_list.html', context)
+    return render_conditional(request, 'posts/group_list.html', context,
+                              f'group:{slug}', page_obj)
 
 
+@cache_feed('author:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    posts = author.posts.select_related('group')
+    page_obj = paginatorr(posts, request)
     context = {
         'author': author,
-        'page_obj': paginatorr(posts, request)
+        'page_obj': page_obj,
+        'following': (
+            request.user.is_authenticated and request.user != author
+            and Follow.objects.filter(
+                user=request.user, author=author).exists()),
     }
     template = 'posts/profile.html'
-    return render(request, template, context)
+    return render_conditional(request, template, context,
+                              f'author:{username}', page_obj)
+
+
+@login_required
+def follow_index(request):
+    page_obj = follow.feed_page(request.user, POSTS_QUANTITY,
+                                request.GET.get('cursor'))
+    return render(request, 'posts/follow.html', {'page_obj': page_obj})
+
+
+@require_POST
+@login_required
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    follow.follow(request.user, author)
+    return redirect('posts:profile', username)
+
+
+@require_POST
+@login_required
+def profile_unfollow(request, username):
+    author = get_object_or_404(User, username=username)
+    follow.unfollow(request.user, author)
+    return redirect('posts:profile', username)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'), pk=post_id)
     author = post.author
+    # Число комментариев уже есть в посте: страницы считать не нужно.
+    comments = KeysetPaginator(
+        post.comments.select_related('author'), COMMENTS_QUANTITY,
+        ordering=COMMENT_ORDERING, bounded_count=post.comment_count,
+    ).get_page(request.GET.get('page'), request.GET.get('cursor'))
     context = {
         'post': post,
         'author': author,
+        'comments': comments,
+        'form': CommentForm(),
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render_conditional(request, 'posts/post_detail.html', context,
+                              f'author:{author.username}', [post])
+
+
+@require_POST
+@login_required
+def add_comment(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    form = CommentForm(request.POST)
+    if form.is_valid():
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        with transaction.atomic():
+            comment.save()
+    return redirect('posts:post_detail', post_id)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        rows, next_cursor = search(
+            query, request.GET.get('cursor'), POSTS_QUANTITY)
+    except InvalidSearchCursor:
+        rows, next_cursor = search(query, None, POSTS_QUANTITY)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, _, _ in rows])
+    context = {
+        'query': query,
+        'results': [(posts[pk], highlight(snippet))
+                    for pk, _, snippet in rows if pk in posts],
+        'next_cursor': next_cursor,
+        'is_continued': bool(request.GET.get('cursor')),
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST':
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            with transaction.atomic():
+                post.save()
             return redirect('posts:profile', post.author)
     return render(
         request,
@@ -72,14 +163,37 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
-    form = PostForm(request.POST or None, instance=post)
+    form = PostForm(request.POST or None, files=request.FILES or None,
+                    instance=post)
     if form.is_valid():
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:post_detail', post_id)
     return render(
         request,
         'posts/create_post.html',
         {'form': form, 'post_id': post_id, 'is_edit': True}
     )
+
+
+@staff_member_required
+def post_export(request):
+    data_format = request.GET.get('format', 'jsonl')
+    if data_format not in CONTENT_TYPES:
+        return HttpResponseBadRequest('Формат: jsonl или csv')
+    filters = {key: request.GET.get(key)
+               for key in ('since', 'until', 'author', 'group')}
+    try:
+        parse_moment(filters['since'])
+        parse_moment(filters['until'])
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        export_lines(data_format, **filters),
+        content_type=CONTENT_TYPES[data_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="posts.{data_format}"')
+    return response
@@ -46,14 +46,18 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,9 +65,12 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# core.perf.DjangoTemplates — шаблоны Django с замером времени рендеринга
+# для PerformanceMiddleware.
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.perf.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,19 +85,113 @@ TEMPLATES = [
     },
 ]
 
+# Разбирать шаблоны posts, users и about при старте процесса
+# (core.template_cache.warm_up); полезно только с cached loader.
+TEMPLATE_WARMUP = False
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Потоки, в которых yatube.asgi выполняет view; сверх них запросы ждут.
+ASGI_THREADS = 8
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.backends.sqlite3 начинает транзакции с BEGIN IMMEDIATE: без этого
+# параллельные записи падают с «database is locked».
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
 
+# Реплики только для чтения. Локально YATUBE_REPLICAS=2 добавит файлы
+# db.replica1.sqlite3 и db.replica2.sqlite3, а manage.py sync_replicas
+# скопирует в них primary.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.environ.get('YATUBE_REPLICAS', 0)) + 1)
+]
+
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# PRAGMA для новых соединений SQLite; профиль yatube.settings_production
+# включает WAL и постоянные соединения.
+SQLITE_PRAGMAS = {}
+
+# Сколько секунд после записи клиент читает только из primary.
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Для нескольких процессов подойдёт FileBasedCache или Redis-совместимый бэкенд.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+POST_CARD_CACHE = 'default'
+
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+FEED_PAGE_CACHE = 'default'
+
+FEED_PAGE_TIMEOUT = 60 * 5
+
+# Первые посты главной держатся в кэше готовыми строками; 0 отключает окно.
+HOME_FEED_CACHE = 'default'
+
+HOME_FEED_WINDOW = 100
+
+# Карточки, страницы лент и окно главной обновляются после коммита
+# транзакции, которая изменила посты (core.db.on_commit).
+CACHE_ON_COMMIT = True
+
+# Посты авторов с таким числом подписчиков не раскладываются по входящим,
+# а забираются при чтении ленты подписок.
+FOLLOW_FANOUT_LIMIT = 1000
+
+# Фоновые задачи (core.tasks) хранятся в таблице core_job основной базы.
+# С TASKS_EAGER задачи выполняются сразу при постановке; профиль
+# yatube.settings_production отдаёт их процессу manage.py run_worker.
+TASKS_EAGER = True
+TASK_MAX_ATTEMPTS = 5
+# Первая пауза перед повтором, секунды; дальше она удваивается.
+TASK_RETRY_DELAY = 10
+# Через столько секунд задачу упавшего воркера заберёт другой.
+TASK_LEASE = 60 * 5
+
+
+# Лимиты POST-запросов по имени URL: «запросов/период» (s, m, h, d),
+# отдельно на адрес клиента и на пользователя (core.ratelimit).
+# «<имя URL>:account» — лимит логина или почты из формы анонимного
+# запроса; его может тратить любой, кто знает логин, поэтому он в 10 раз
+# больше лимита адреса и не даёт одному адресу заблокировать владельца.
+RATE_LIMITS = {
+    'posts:post_create': '10/m',
+    'posts:add_comment': '20/m',
+    'users:signup': '5/h',
+    'users:signup:account': '50/h',
+    'users:login': '10/m',
+    'users:login:account': '100/m',
+    'users:password_reset': '5/h',
+    'users:password_reset:account': '50/h',
+}
+
+RATE_LIMIT_CACHE = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -111,6 +212,25 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Хэшеры паролей; первый хэширует новые пароли, остальные проверяют
+# старые. Хэш другим алгоритмом или с другими параметрами Django
+# пересчитывает при входе пользователя. Время хэширования на этой
+# машине показывает manage.py hash_timings.
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'core.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+PBKDF2_ITERATIONS = 150000
+
+# Параметры Argon2: проходы, память в КиБ, потоки.
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 512
+ARGON2_PARALLELISM = 2
+
+
 # Internationalization ..
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -120,7 +240,10 @@ LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь задач, а отправляет их TASK_EMAIL_BACKEND.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+
+TASK_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -138,3 +261,15 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Имена загрузок и миниатюр не переиспользуются, поэтому браузер может
+# кэшировать их надолго. Без фронтового сервера media раздаёт Django.
+SERVE_MEDIA = True
+MEDIA_CACHE_SECONDS = 60 * 60 * 24 * 365
+
+# Миниатюры создаются в фоновом пуле потоков; 0 — прямо в запросе.
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+THUMBNAIL_WORKERS = 2
@@ -0,0 +1,73 @@
+"""
+Production settings for yatube project.
+
+Run with ``--settings yatube.settings_production`` or
+``DJANGO_SETTINGS_MODULE=yatube.settings_production``.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import (ALLOWED_HOSTS, DATABASES, PASSWORD_HASHERS,
+                       SECRET_KEY, TEMPLATES)
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = os.environ.get(
+    'YATUBE_ALLOWED_HOSTS', ','.join(ALLOWED_HOSTS)).split(',')
+
+# Шаблоны разбираются один раз на процесс и сразу при старте, а не
+# при первом запросе к странице.
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+TEMPLATE_WARMUP = True
+
+# Соединение живёт между запросами и проверяется перед повторным
+# использованием (core.db.check_connections).
+DATABASES = {
+    alias: {**database, 'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}
+    for alias, database in DATABASES.items()
+}
+
+# Применяются к каждому новому соединению SQLite (core.db.configure_sqlite).
+# WAL не даёт писателю блокировать читателей, NORMAL синхронизирует диск
+# только на контрольных точках WAL, busy_timeout ждёт блокировку до 5 с.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+}
+
+# Загрузки и миниатюры раздаёт фронтовой сервер из MEDIA_ROOT
+# с заголовком Cache-Control: max-age=MEDIA_CACHE_SECONDS, immutable.
+SERVE_MEDIA = False
+
+# Письма, раскладка постов по входящим и миниатюры выполняются
+# процессом manage.py run_worker, а не в запросе.
+TASKS_EAGER = False
+
+# Новые пароли хэширует Argon2 (нужен argon2-cffi); пароли PBKDF2
+# пересчитываются при входе. 19 МиБ и два прохода — примерно столько же
+# процессорного времени, сколько у PBKDF2, но перебор на GPU дороже.
+PASSWORD_HASHERS = [
+    'core.hashers.Argon2PasswordHasher',
+    *(hasher for hasher in PASSWORD_HASHERS
+      if hasher != 'core.hashers.Argon2PasswordHasher'),
+]
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 19 * 1024
+ARGON2_PARALLELISM = 1
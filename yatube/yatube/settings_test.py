@@ -0,0 +1,17 @@
+"""
+Test and benchmark settings for yatube project.
+
+``manage.py test`` and ``manage.py bench`` use them unless
+``DJANGO_SETTINGS_MODULE`` or ``--settings`` says otherwise; pytest
+picks them up from pytest.ini.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+# Стойкость хэша паролей здесь не нужна, а PBKDF2 тратит десятки
+# миллисекунд на каждый create_user с паролем и каждый вход.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# TestCase откатывает транзакцию теста и не вызывает колбэки on_commit:
+# кэш обновляется сразу (core.db.on_commit).
+CACHE_ON_COMMIT = False